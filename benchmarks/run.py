@@ -0,0 +1,216 @@
+"""Benchmark runner
+
+Runs each service against the local stand-in servers at several payload sizes,
+measuring queries per second, p50/p99 latency and peak RSS. Every case runs in
+a fresh interpreter, so peak RSS reflects that case alone.
+
+Usage::
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 10 1000 --iterations 50 --cases json xpath
+    python -m benchmarks.run --compare benchmarks/results/1.0.1.json
+
+Results are saved to benchmarks/results/<version>.json by default, so they can
+be compared between versions with --compare.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    "json": ("libweb.json", "JsonService", lambda http, size: {
+        "url": "{0}/json?size={1}".format(http, size),
+        "jsonpath": {"ip": "$.data[*].ip"},
+    }),
+    "xpath": ("libweb.xpath", "XpathService", lambda http, size: {
+        "url": "{0}/xml?size={1}".format(http, size),
+        "xpath": {"name": "//item/name/text()"},
+    }),
+    "html_xpath": ("libweb.xpath", "HtmlXpathService", lambda http, size: {
+        "url": "{0}/html?size={1}".format(http, size),
+        "xpath": {"ip": '//td[@class="ip"]/text()'},
+    }),
+    "regex": ("libweb.regex", "RegexService", lambda http, size: {
+        "url": "{0}/text?size={1}".format(http, size),
+        "parse": [r"ip: (?P<ip>\S+)"],
+    }),
+    "dns": ("libweb.dns", "DnsService", lambda http, size: {
+        "rrname": "{{target}}.n{0}.bench.test".format(size),
+        "rrtype": "A",
+    }),
+    "dnsbl": ("libweb.dns", "DnsblService", lambda http, size: {
+        "rrname": "{{target}}.n{0}.bl.bench.test.".format(size),
+        "rrtype": "TXT",
+    }),
+}
+
+# DNS answers are limited by the size of a UDP datagram
+DNS_SIZE_LIMIT = 50
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of values"""
+    values = sorted(values)
+    idx = max(0, int(round(pct / 100.0 * len(values))) - 1)
+    return values[idx]
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, if it can be measured"""
+    try:
+        import resource
+    except ImportError:  # pragma nocover
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def build_service(case, size, http_url, dns_port):
+    """Instantiate the service for a benchmark case"""
+    import importlib
+
+    (module, name, make_conf) = CASES[case]
+    cls = getattr(importlib.import_module(module), name)
+
+    if module == "libweb.dns":
+        base = cls
+
+        def get_resolver(self):
+            resolver = base.get_resolver(self)
+            resolver.nameservers = ["127.0.0.1"]
+            resolver.port = dns_port
+            return resolver
+        cls = type(name, (base,), {"get_resolver": get_resolver})
+
+    service = cls(opts={"target": "127.0.0.2"}, **make_conf(http_url, size))
+    service.swallow_exceptions = False
+    return service
+
+
+def run_case(case, size, iterations, http_url, dns_port, warmup=3):
+    """Run a single case in this process and return its measurements"""
+    service = build_service(case, size, http_url, dns_port)
+
+    for _ in range(warmup):
+        list(service)
+
+    latencies = list()
+    results = 0
+    start = time.time()
+    for _ in range(iterations):
+        query_start = time.time()
+        results += len(list(service))
+        latencies.append(time.time() - query_start)
+    elapsed = time.time() - start
+
+    return {
+        "case": case,
+        "size": size,
+        "iterations": iterations,
+        "results_per_query": results // iterations,
+        "qps": iterations / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_rss_mb": (peak_rss() or 0) / (1024.0 * 1024.0),
+    }
+
+
+def spawn_case(case, size, iterations, http_url, dns_port):
+    """Run a single case in a fresh interpreter"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([os.path.join(ROOT, "src"), ROOT,
+                                         env.get("PYTHONPATH", "")])
+    cmd = [sys.executable, "-m", "benchmarks.run", "--worker", case, str(size),
+           str(iterations), http_url, str(dns_port)]
+    output = subprocess.check_output(cmd, env=env, cwd=ROOT)
+    return json.loads(output.decode("utf-8"))
+
+
+def compare(results, baseline):
+    """Print the change in each measurement relative to a baseline run"""
+    previous = dict(((row["case"], row["size"]), row) for row in baseline["results"])
+    print("\nCompared to {0}:".format(baseline.get("version")))
+    for row in results:
+        old = previous.get((row["case"], row["size"]))
+        if old is None:
+            continue
+        changes = list()
+        for key in ("qps", "p50_ms", "p99_ms", "peak_rss_mb"):
+            if old[key]:
+                changes.append("{0} {1:+.1f}%".format(key, (row[key] / old[key] - 1) * 100))
+        print("  {0:<12} {1:>7}  {2}".format(row["case"], row["size"], "  ".join(changes)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--cases", nargs="+", default=sorted(CASES), choices=sorted(CASES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 1000, 10000])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output", help="Where to save results "
+                        "(default: benchmarks/results/<version>.json)")
+    parser.add_argument("--compare", help="A previous results file to compare against")
+    parser.add_argument("--worker", nargs=5, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        (case, size, iterations, http_url, dns_port) = args.worker
+        print(json.dumps(run_case(case, int(size), int(iterations), http_url, int(dns_port))))
+        return
+
+    from benchmarks.servers import start_servers
+    import libweb
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fobj:
+            baseline = json.load(fobj)
+
+    (http, dns_server) = start_servers()
+    http_url = "http://127.0.0.1:{0}".format(http.server_address[1])
+    dns_port = dns_server.server_address[1]
+
+    results = list()
+    try:
+        print("{0:<12} {1:>7} {2:>9} {3:>9} {4:>9} {5:>9}".format(
+            "case", "size", "q/s", "p50 ms", "p99 ms", "rss MB"))
+        for case in args.cases:
+            sizes = args.sizes
+            if case.startswith("dns"):
+                sizes = sorted(set(min(size, DNS_SIZE_LIMIT) for size in sizes))
+            for size in sizes:
+                row = spawn_case(case, size, args.iterations, http_url, dns_port)
+                results.append(row)
+                print("{case:<12} {size:>7} {qps:>9.1f} {p50_ms:>9.2f} {p99_ms:>9.2f} "
+                      "{peak_rss_mb:>9.1f}".format(**row))
+    finally:
+        http.shutdown()
+        dns_server.shutdown()
+
+    report = {
+        "version": libweb.__version__,
+        "python": sys.version.split()[0],
+        "timestamp": time.time(),
+        "results": results,
+    }
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results",
+                                         "{0}.json".format(libweb.__version__))
+    if not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, "w") as fobj:
+        json.dump(report, fobj, indent=2, sort_keys=True)
+    print("\nSaved results to {0}".format(output))
+
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
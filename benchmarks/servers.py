@@ -0,0 +1,175 @@
+"""Local stand-in servers for the benchmark suite
+
+The HTTP server generates JSON, XML, HTML and plain text documents of a
+requested size, and the DNS server answers every A and TXT query
+authoritatively, so benchmarks never touch the network.
+"""
+import json
+import socket
+import threading
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:  # pragma nocover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+import dns.flags
+import dns.message
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+
+
+def make_json(size):
+    """A JSON document with `size` records under $.data"""
+    return json.dumps({
+        "count": size,
+        "data": [{"id": idx, "ip": "10.0.{0}.{1}".format(idx // 256 % 256, idx % 256),
+                  "tags": ["bench", str(idx % 7)]} for idx in range(size)],
+    }).encode("utf-8")
+
+
+def make_xml(size):
+    """An XML document with `size` item elements"""
+    items = "".join(
+        '<item id="{0}"><name>item {0}</name><value>{1}</value></item>'.format(idx, idx * 3)
+        for idx in range(size)
+    )
+    return '<?xml version="1.0"?><items>{0}</items>'.format(items).encode("utf-8")
+
+
+def make_html(size):
+    """An HTML document with a `size` row table"""
+    rows = "".join(
+        '<tr><td class="ip">10.0.{0}.{1}</td><td>row {2}</td></tr>'.format(
+            idx // 256 % 256, idx % 256, idx)
+        for idx in range(size)
+    )
+    return ("<!DOCTYPE html><html><head><title>bench</title></head><body>"
+            "<table>{0}</table></body></html>").format(rows).encode("utf-8")
+
+
+def make_text(size):
+    """A plain text document with `size` key/value lines"""
+    return "".join(
+        "ip: 10.0.{0}.{1} score: {2}\n".format(idx // 256 % 256, idx % 256, idx % 100)
+        for idx in range(size)
+    ).encode("utf-8")
+
+
+DOCUMENTS = {
+    "/json": ("application/json", make_json),
+    "/xml": ("application/xml", make_xml),
+    "/html": ("text/html", make_html),
+    "/text": ("text/plain", make_text),
+}
+
+
+class BenchHandler(BaseHTTPRequestHandler):
+    """Serves generated documents, e.g. /json?size=100. Documents are cached per size"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    cache = dict()
+    lock = threading.Lock()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        url = urlparse(self.path)
+        if url.path not in DOCUMENTS:
+            self.send_error(404)
+            return
+        size = int(parse_qs(url.query).get("size", ["10"])[0])
+
+        (content_type, factory) = DOCUMENTS[url.path]
+        with self.lock:
+            body = self.cache.get((url.path, size))
+            if body is None:
+                body = self.cache[(url.path, size)] = factory(size)
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class BenchHttpServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class BenchDnsServer(object):
+    """A UDP DNS server answering every A and TXT query
+
+    The number of records in each answer is taken from a label of the form
+    "n<count>" (e.g. "n10.bench.test." returns 10 records), and defaults to 1.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.server_address = self.sock.getsockname()
+        self.running = False
+
+    @staticmethod
+    def answer(query):
+        """Build the response to a single query message"""
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+        for question in query.question:
+            count = 1
+            for label in question.name.labels:
+                label = label.decode("ascii", "ignore")
+                if label.startswith("n") and label[1:].isdigit():
+                    count = int(label[1:])
+            if question.rdtype == dns.rdatatype.A:
+                rdatas = ["127.0.{0}.{1}".format(idx // 256 % 256, idx % 256 + 1)
+                          for idx in range(count)]
+            elif question.rdtype == dns.rdatatype.TXT:
+                rdatas = ['"https://bench.test/{0}/{1}"'.format(question.name, idx)
+                          for idx in range(count)]
+            else:
+                continue
+            response.answer.append(dns.rrset.from_text_list(
+                question.name, 60, dns.rdataclass.IN, question.rdtype, rdatas))
+        return response
+
+    def serve_forever(self):
+        self.running = True
+        while self.running:
+            try:
+                (wire, addr) = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            response = self.answer(dns.message.from_wire(wire))
+            self.sock.sendto(response.to_wire(), addr)
+
+    def shutdown(self):
+        self.running = False
+
+    def server_close(self):
+        self.sock.close()
+
+
+def start(server):
+    """Run a server on a daemon thread, returning the thread"""
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def start_servers():
+    """Start an HTTP and a DNS server on ephemeral ports"""
+    http = BenchHttpServer(("127.0.0.1", 0), BenchHandler)
+    dns_server = BenchDnsServer()
+    start(http)
+    start(dns_server)
+    return (http, dns_server)
@@ -27,6 +27,7 @@ setup(
     long_description=get_long_description(),
     install_requires=[
         "dnspython" if sys.version_info[0] == 2 else "dnspython3",
+        "futures; python_version < '3.2'",
         "requests",
         "defusedxml",
         "lxml",
@@ -34,9 +35,11 @@ setup(
         "jsonpath-rw-ext",
         "relatime",
         "tzlocal",
-        "filemagic",
         # "feedparser",
     ],
+    extras_require={
+        "async": ["aiohttp", "dnspython>=2.0"],
+    },
     classifiers=[
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python :: 3 :: Only",
@@ -8,9 +8,14 @@ Description goes here
 """
 
 
+import copy
+import itertools
 import logging
 import time
 
+from .cache import cache_key
+from .metrics import increment, record
+
 
 __version__ = "1.0.1"
 
@@ -25,6 +30,27 @@ class WebService(object):  # pylint: disable=too-few-public-methods
     If False, exceptions raised when communicating with the service will
     propagate to the caller. Otherwise, they will result in empty iteration
     """
+    metrics = None
+    """
+    A :class:`libweb.metrics.Metrics` instance which is notified of per-phase
+    timings and counters. Disabled when None
+    """
+    cache = None
+    """
+    A :class:`libweb.cache.ResultCache` instance used to store and replay the
+    extracted results of identical queries. Disabled when None
+    """
+    compact_results = False
+    """
+    If True, results are yielded as compact :mod:`libweb.records` tuples, which
+    behave like read-only mappings, instead of dicts
+    """
+    single_flight = None
+    """
+    A :class:`libweb.singleflight.SingleFlight` group used to coalesce identical
+    requests made concurrently by any service. Disabled when None
+    """
+    _plan = None
 
     def __init__(self, creds=None, opts=None, **conf):
         """
@@ -44,6 +70,63 @@ class WebService(object):  # pylint: disable=too-few-public-methods
             self.__class__.__name__
         ))
 
+    @property
+    def conf(self):
+        """Settings for configuring the service. Assign a new value to change
+        them, as the compiled :attr:`plan` is only rebuilt on assignment
+        """
+        return self._conf
+
+    @conf.setter
+    def conf(self, value):
+        self._conf = value
+        self._plan = None
+
+    @property
+    def creds(self):
+        """A dictionary of credentials to be used by the service"""
+        return self._creds
+
+    @creds.setter
+    def creds(self, value):
+        self._creds = value
+        self._plan = None
+
+    @property
+    def plan(self):
+        """The service's configuration, compiled by :meth:`build_plan`
+
+        The plan is built once and shared by every copy made by :meth:`bind`,
+        so it must not be modified once built.
+        """
+        plan = self._plan
+        if plan is None:
+            plan = self._plan = self.build_plan()
+        return plan
+
+    def build_plan(self):  # pylint: disable=no-self-use
+        """Compile the configuration into the form used for each query
+
+        Override this to parse templates, expressions, etc. just once,
+        instead of for every target.
+        """
+        return dict()
+
+    def bind(self, opts):
+        """Return a copy of this service which will run against the given options
+
+        The copy shares this service's configuration and compiled :attr:`plan`,
+        so binding is cheap, and a single service may be bound to many targets
+        from several threads at once.
+
+        Args:
+            opts (dict): Options specific to the request
+        """
+        service = copy.copy(self)
+        service._plan = self.plan  # pylint: disable=protected-access
+        service.opts = opts
+        return service
+
     def get_results(self):
         """Communicates with the web service and yields parsed results
 
@@ -53,14 +136,101 @@ class WebService(object):  # pylint: disable=too-few-public-methods
         """
         raise NotImplementedError
 
+    def aget_results(self):
+        """Asynchronous variant of :meth:`get_results`, for use with ``async for``
+
+        The default implementation runs :meth:`get_results` in the event loop's
+        executor, so that it does not block the loop. Subclasses with a
+        non-blocking transport override this.
+        """
+        from .aio import threaded_results
+        return threaded_results(self)
+
+    def cache_key(self):
+        """Return the key under which this service's results are cached
+
+        Override this if some configuration or options should not distinguish
+        otherwise identical queries
+        """
+        return cache_key(self)
+
+    def _cached_results(self):
+        """Yield results from the cache if possible, otherwise from get_results
+
+        Results are only stored once get_results has been completely consumed
+        without error.
+        """
+        if self.cache is None:
+            for result in self.get_results():
+                yield result
+            return
+
+        key = self.cache_key()
+        results = self.cache.get(key)
+        if results is not None:
+            increment(self, "cache_hits")
+            for result in results:
+                yield result
+            return
+
+        increment(self, "cache_misses")
+        results = list()
+        for result in self.get_results():
+            results.append(result)
+            yield result
+        self.cache.set(key, results)
+
+    def map(self, targets, concurrency=4):
+        """Run this service's configuration against many targets concurrently
+
+        Targets are run on a pool of worker threads, and no more than
+        ``concurrency`` of them are queued at any one time, so ``targets`` may
+        be a (long) generator.
+
+        Args:
+            targets (iterable): Options dicts (see ``opts``), one per target
+
+        Kwargs:
+            concurrency (int): The maximum number of targets to query at once
+
+        Yields:
+            (opts, result) tuples, in the order that the targets complete
+        """
+        from concurrent import futures
+
+        targets = iter(targets)
+        with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = dict()
+            while True:
+                for opts in itertools.islice(targets, concurrency - len(pending)):
+                    future = executor.submit(list, self.bind(opts))
+                    pending[future] = opts
+                if not pending:
+                    break
+
+                done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    opts = pending.pop(future)
+                    for result in future.result():
+                        yield (opts, result)
+
     def __iter__(self):
         start = time.time()
+        count = 0
         try:
-            for result in self.get_results():
+            for result in self._cached_results():
+                count += 1
                 yield result
         except Exception as exc:  # pylint: disable=broad-except
             self.logger.error(str(exc))
             if not self.swallow_exceptions:
                 raise
-        duration = round(time.time() - start, 2)
-        self.logger.debug("Query took %s seconds", duration)
+        finally:
+            duration = time.time() - start
+            record(self, "query", duration)
+            increment(self, "results", count)
+        self.logger.debug("Query took %s seconds", round(duration, 2))
+
+    def __aiter__(self):
+        from .aio import iterate
+        return iterate(self)
@@ -0,0 +1,319 @@
+"""Asyncio support
+
+This module implements the ``async for`` protocol for libweb services. It is
+imported on first use by :meth:`libweb.WebService.__aiter__` and the ``aget_results``
+and ``amake_requests`` methods, and requires Python 3.6 or later.
+
+HTTP requests are sent with aiohttp when it is installed, and DNS queries use
+dnspython's asyncresolver when it is available (dnspython 2.0 or later). Without
+them, the blocking implementations are run in the event loop's executor.
+
+Services on the same event loop share one aiohttp session (see
+:func:`get_session`), so connections are reused across targets. Requests which
+depend on the blocking send path are still sent through it in the executor:
+those of services with a custom :attr:`libweb.http.HttpService.transport` or
+with ``single_flight`` set, and streamed or spooled requests. Likewise, DNS
+queries of services with ``single_flight`` set, or which override
+:meth:`libweb.dns.DnsService.resolve`, are resolved in the executor.
+"""
+import asyncio
+import functools
+import time
+import weakref
+
+import dns.resolver
+import requests
+import requests.hooks
+import requests.utils
+from requests.structures import CaseInsensitiveDict
+
+from .metrics import increment, record, timer
+
+try:
+    import aiohttp
+except ImportError:  # pragma nocover
+    aiohttp = None
+
+
+_DONE = object()
+
+_sessions = weakref.WeakKeyDictionary()
+
+
+def _next(iterator):
+    """Advance a blocking iterator, returning a sentinel instead of raising StopIteration"""
+    return next(iterator, _DONE)
+
+
+async def iterate(service):
+    """Yield the service's results, mirroring the behavior of WebService.__iter__"""
+    start = time.time()
+    count = 0
+    try:
+        async for result in cached_results(service):
+            count += 1
+            yield result
+    except Exception as exc:  # pylint: disable=broad-except
+        service.logger.error(str(exc))
+        if not service.swallow_exceptions:
+            raise
+    finally:
+        duration = time.time() - start
+        record(service, "query", duration)
+        increment(service, "results", count)
+    service.logger.debug("Query took %s seconds", round(duration, 2))
+
+
+async def cached_results(service):
+    """Asynchronous implementation of WebService._cached_results"""
+    if service.cache is None:
+        async for result in service.aget_results():
+            yield result
+        return
+
+    key = service.cache_key()
+    results = service.cache.get(key)
+    if results is not None:
+        increment(service, "cache_hits")
+        for result in results:
+            yield result
+        return
+
+    increment(service, "cache_misses")
+    results = list()
+    async for result in service.aget_results():
+        results.append(result)
+        yield result
+    service.cache.set(key, results)
+
+
+async def threaded_results(service):
+    """Run the service's blocking get_results in the executor, one result at a time"""
+    loop = asyncio.get_event_loop()
+    iterator = iter(service.get_results())
+    while True:
+        result = await loop.run_in_executor(None, _next, iterator)
+        if result is _DONE:
+            break
+        yield result
+
+
+async def response_results(service):
+    """Fetch responses without blocking and parse each one as it arrives"""
+    async for response in service.amake_requests():
+        for result in service.parse_response(response):
+            yield result
+
+
+async def http_results(service):
+    """Fetch responses without blocking, parsing or replaying the results of each"""
+    async for response in service.amake_requests():
+        for result in service._conditional_results(response):  # pylint: disable=protected-access
+            yield result
+
+
+def get_session():
+    """Return the aiohttp session shared by the services on the running event
+    loop, creating it if necessary
+
+    The session is closed by :func:`close_session`, which should be awaited
+    before the event loop is closed.
+    """
+    loop = asyncio.get_event_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _sessions[loop] = aiohttp.ClientSession()
+    return session
+
+
+async def close_session():
+    """Close the aiohttp session shared on the running event loop, if any"""
+    session = _sessions.pop(asyncio.get_event_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+def _aiohttp_sendable(service, query):
+    """True if a request can be sent with aiohttp rather than service._send"""
+    from .transport import RequestsTransport
+
+    return (type(service.transport) is RequestsTransport  # pylint: disable=unidiomatic-typecheck
+            and service.single_flight is None and not service.streamed(query))
+
+
+async def _aiohttp_send(session, request, verify_ssl=True):
+    """Send a prepared request with aiohttp and convert the reply to a requests.Response"""
+    async with session.request(request.method, request.url, headers=dict(request.headers),
+                               data=request.body,
+                               ssl=None if verify_ssl else False) as reply:
+        response = requests.Response()
+        response.status_code = reply.status
+        response.reason = reply.reason
+        response.url = str(reply.url)
+        response.headers = CaseInsensitiveDict(reply.headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = await reply.read()  # pylint: disable=protected-access
+        response._content_consumed = True  # pylint: disable=protected-access
+        response.request = request
+    return requests.hooks.dispatch_hook("response", request.hooks, response)
+
+
+def _retryable(service, exc):
+    """True if a request which raised exc may be retried"""
+    # pylint: disable=protected-access
+    if aiohttp is not None and isinstance(exc, aiohttp.ClientError):
+        return True
+    return isinstance(exc, asyncio.TimeoutError) or service._retryable(exc)
+
+
+async def _http_request(service, session, url, query):  # pylint: disable=too-many-locals
+    """Asynchronous implementation of HttpService._req"""
+    # pylint: disable=protected-access
+    loop = asyncio.get_event_loop()
+    limiter = service.get_rate_limiter(url, query)
+    breaker = service.get_circuit_breaker(url, query)
+    policy = service.get_retry_policy(query)
+    attempt = 0
+
+    while True:
+        if limiter is not None:
+            with timer(service, "throttle"):
+                await asyncio.sleep(limiter.reserve())
+
+        with timer(service, "network"):
+            request = service._prepare(url, **query)
+            revalidation = service._revalidate(request, query)
+            verify_ssl = query.get("verify_ssl", True)
+            if breaker is not None:
+                breaker.check()
+            try:
+                if session is not None and _aiohttp_sendable(service, query):
+                    response = await _aiohttp_send(session, request, verify_ssl=verify_ssl)
+                else:
+                    send = functools.partial(service._send, request, query)
+                    response = await loop.run_in_executor(None, send)
+            except Exception as exc:  # pylint: disable=broad-except
+                delay = service._attempted(breaker, policy, attempt, request.method,
+                                           retryable=_retryable(service, exc))
+                if delay is None:
+                    raise
+            else:
+                delay = service._attempted(breaker, policy, attempt, request.method, response)
+                if delay is None:
+                    break
+                response.close()
+
+        attempt += 1
+        service.logger.debug("Retrying %s in %.2f seconds", url, delay)
+        with timer(service, "backoff"):
+            await asyncio.sleep(delay)
+
+    service._revalidated(response, revalidation)
+    return service._receive(response, query)
+
+
+async def _http_pages(service, session, url, query):
+    """Asynchronous implementation of HttpService._pages"""
+    # pylint: disable=protected-access
+    response = await _http_request(service, session, url, query)
+    service._check_status(response, query)
+
+    pages = 1
+    while True:
+        following = service._next_query(url, response, query, pages)
+        if following is None:
+            yield response
+            return
+        (url, query) = following
+
+        if query["paginate"].get("prefetch", True):
+            task = asyncio.ensure_future(_http_request(service, session, url, query))
+            try:
+                yield response
+            except BaseException:
+                task.cancel()
+                raise
+            response = await task
+        else:
+            yield response
+            response = await _http_request(service, session, url, query)
+        service._check_status(response, query)
+        pages += 1
+
+
+async def http_make_requests(service):
+    """Asynchronous implementation of HttpService.make_requests"""
+    session = None
+    if aiohttp is not None and service.async_transport == "aiohttp":
+        session = get_session()
+
+    parallel = service.conf.get("parallel")
+    if parallel and len(service.plan["urls"]) > 1:
+        responses = _http_parallel_pages(service, session, parallel)
+    else:
+        responses = _http_sequential_pages(service, session)
+    async for response in responses:
+        yield response
+
+
+async def _http_sequential_pages(service, session):
+    """Request each URL in turn"""
+    for (url, query) in service._queries():  # pylint: disable=protected-access
+        async for response in _http_pages(service, session, url, query):
+            yield response
+
+
+async def _http_parallel_pages(service, session, parallel):
+    """Asynchronous implementation of HttpService._parallel_pages"""
+    semaphore = asyncio.Semaphore(parallel.get("workers", 4))
+
+    async def fetch(url, query):
+        async with semaphore:
+            return [response async for response in _http_pages(service, session, url, query)]
+
+    tasks = [asyncio.ensure_future(fetch(url, query))
+             for (url, query) in service._queries()]  # pylint: disable=protected-access
+    try:
+        pending = tasks
+        if parallel.get("order", "original") == "completion":
+            pending = asyncio.as_completed(tasks)
+        for task in pending:
+            for response in await task:
+                yield response
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def dns_make_requests(service, native=True):
+    """Asynchronous implementation of DnsService.make_requests
+
+    Unless native is True, queries are resolved with the service's blocking
+    resolve method in the executor.
+    """
+    loop = asyncio.get_event_loop()
+    for (rrname, rrtype) in service._queries():  # pylint: disable=protected-access
+        try:
+            with timer(service, "network"):
+                if native:
+                    rrset = await service.get_async_resolver().resolve(rrname, rrtype)
+                else:
+                    rrset = await loop.run_in_executor(
+                        None, service.resolve, service.get_resolver(), rrname, rrtype)
+        except dns.resolver.NXDOMAIN:
+            return
+        else:
+            yield rrset
+
+
+async def dns_results(service):
+    """Resolve without blocking when dnspython provides an async resolver"""
+    try:
+        import dns.asyncresolver  # noqa: F401 pylint: disable=unused-import,redefined-outer-name
+    except ImportError:  # pragma nocover
+        results = threaded_results(service)
+    else:
+        results = response_results(service)
+
+    async for result in results:
+        yield result
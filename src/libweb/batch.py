@@ -0,0 +1,128 @@
+"""Request Batching
+
+This module implements the batchers used by HTTP services to look up many
+targets in a single request, for APIs which accept several indicators at once
+(as a comma-separated parameter, or a list in a POST body). Batching is enabled
+with the ``batch`` setting of an HTTP service:
+
+.. code:: python
+
+    conf = {
+        "url": "https://api.example.com/ip?addresses={ip}",
+        "batch": {"option": "ip", "key": "address", "items": "$.results[*]",
+                  "size": 100, "wait": 0.05},
+        "jsonpath": {"address": "$.address", ...},
+    }
+
+The ``option`` is the option which differs between targets. For a batched
+request, it is rendered into the configured templates as the targets' values
+joined by the ``separator`` (a comma, by default). If ``json`` is True, the
+values are also sent as a JSON list in the request body, or if it is a string,
+as a JSON object with the list under that name.
+
+Each result extracted from the batched response is returned to the target whose
+value equals the result's ``key`` field. Results which match no target are
+discarded. JSON services apply their jsonpath expressions to each item matched
+by the ``items`` jsonpath in turn, rather than to the whole response, so that
+each item gives a separate result.
+
+:meth:`libweb.http.HttpService.map` splits its targets into batches of up to
+``size`` targets. Services bound to single targets and iterated from several threads
+share a process-wide :class:`Batcher`, which collects targets until ``size``
+have been submitted, or ``wait`` seconds have passed since the first.
+"""
+import sys
+import threading
+
+from .registry import Registry
+
+
+class _Batch(object):  # pylint: disable=too-few-public-methods
+    """A batch of values being collected, and its outcome once complete"""
+
+    def __init__(self):
+        self.values = list()
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.exc_info = None
+
+
+class Batcher(object):
+    """Collects values submitted by several threads into batches
+
+    Kwargs:
+        size (int): The maximum number of values in a batch
+        wait (float): The number of seconds to wait for a batch to fill up
+    """
+
+    def __init__(self, size=100, wait=0.05):
+        self.size = size
+        self.wait = wait
+        self.lock = threading.Lock()
+        self.pending = None
+
+    def submit(self, value, func):
+        """Add value to the current batch, and return the results for value
+
+        func is called with the list of values in the batch, by the thread which
+        started the batch, once the batch is full or its wait has expired. It
+        must return a dict mapping each value to a list of results. Exceptions
+        raised by func are raised to every thread in the batch.
+        """
+        with self.lock:
+            batch = self.pending
+            leader = batch is None
+            if leader:
+                batch = self.pending = _Batch()
+            batch.values.append(value)
+            if len(batch.values) >= self.size:
+                self.pending = None
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+            if batch.exc_info is not None:
+                raise batch.exc_info[1]
+            return batch.results.get(value, [])
+
+        batch.full.wait(self.wait)
+        with self.lock:
+            if self.pending is batch:
+                self.pending = None
+        try:
+            batch.results = func(list(batch.values))
+        except BaseException:
+            batch.exc_info = sys.exc_info()
+            raise
+        finally:
+            batch.done.set()
+        return batch.results.get(value, [])
+
+
+def demultiplex(values, results, key):
+    """Group results by the target value in their key field
+
+    Returns a dict mapping each of values to the list of its results.
+    """
+    grouped = dict((value, list()) for value in values)
+    for result in results:
+        matches = grouped.get(str(result.get(key)))
+        if matches is not None:
+            matches.append(result)
+    return grouped
+
+
+_batchers = Registry(Batcher)
+
+
+def get_batcher(key, size=100, wait=0.05):
+    """Return the process-wide batcher for key, creating it if necessary
+    (see :mod:`libweb.registry`)
+    """
+    return _batchers.get(key, size=size, wait=wait)
+
+
+def reset():
+    """Discard all registered batchers"""
+    _batchers.reset()
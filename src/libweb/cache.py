@@ -0,0 +1,178 @@
+"""Result Caching
+
+This module implements the opt-in result caches used by :class:`libweb.WebService`.
+A cache stores the fully extracted results of a service, keyed by the service
+class, configuration, credentials and options. Caching is enabled by assigning
+a cache to the service's ``cache`` attribute:
+
+.. code:: python
+
+    from libweb import WebService
+    from libweb.cache import MemoryCache, SqliteCache, TieredCache
+
+    WebService.cache = TieredCache(
+        MemoryCache(maxsize=10000, ttl=300),
+        SqliteCache("/var/cache/libweb.sqlite", ttl=3600),
+    )
+
+Cached results are shared between callers, and should be treated as read-only.
+"""
+import hashlib
+import json
+import os
+import pickle  # nosec
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(service):
+    """Build a stable cache key from a service's class, configuration, credentials,
+    options and result shape
+
+    The credentials are included (hashed separately), as results may depend on
+    the account used to fetch them. Whether results are compact is included, so
+    that services sharing a cache are never replayed results of the wrong type.
+    """
+    creds = json.dumps(service.creds, sort_keys=True, default=repr, separators=(",", ":"))
+    ident = [
+        service.__class__.__module__,
+        service.__class__.__name__,
+        service.conf,
+        hashlib.sha256(creds.encode("utf-8")).hexdigest(),
+        service.opts,
+        bool(service.compact_results),
+    ]
+    data = json.dumps(ident, sort_keys=True, default=repr, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    """Base cache, which never stores anything"""
+
+    def get(self, key):  # pylint: disable=no-self-use,unused-argument
+        """Return the cached list of results for key, or None if there is none"""
+        return None
+
+    def set(self, key, results):
+        """Store a list of results under key"""
+        pass
+
+
+class MemoryCache(ResultCache):
+    """A bounded, thread-safe in-process LRU cache with TTL expiry
+
+    Kwargs:
+        maxsize (int): The maximum number of entries to keep
+        ttl (int): The number of seconds an entry remains valid
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            (expires, results) = entry
+            if expires < time.time():
+                del self.entries[key]
+                return None
+            # Mark as most recently used
+            del self.entries[key]
+            self.entries[key] = entry
+            return results
+
+    def set(self, key, results):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + self.ttl, list(results))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Discard all entries"""
+        with self.lock:
+            self.entries.clear()
+
+
+class SqliteCache(ResultCache):
+    """An on-disk cache, which may be shared by multiple processes
+
+    Kwargs:
+        path (str): The path of the SQLite database file
+        ttl (int): The number of seconds an entry remains valid
+        timeout (float): How long to wait on a database locked by another process
+    """
+
+    def __init__(self, path, ttl=3600, timeout=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, expires REAL NOT NULL, results BLOB NOT NULL)"
+        )
+
+    @property
+    def connection(self):
+        """Return a connection private to the current thread (and process)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self.connection.execute(
+            "SELECT results FROM results WHERE key = ? AND expires >= ?",
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])  # nosec
+
+    def set(self, key, results):
+        import sqlite3
+
+        data = pickle.dumps(list(results), pickle.HIGHEST_PROTOCOL)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results (key, expires, results) VALUES (?, ?, ?)",
+            (key, time.time() + self.ttl, sqlite3.Binary(data))
+        )
+
+    def purge(self):
+        """Delete expired entries from the database"""
+        self.connection.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+
+
+class TieredCache(ResultCache):
+    """Checks each cache in turn, copying hits into the faster tiers before it
+
+    Args:
+        tiers (ResultCache): Caches ordered from fastest to slowest
+    """
+
+    def __init__(self, *tiers):
+        self.tiers = tiers
+
+    def get(self, key):
+        for (idx, tier) in enumerate(self.tiers):
+            results = tier.get(key)
+            if results is not None:
+                for faster in self.tiers[:idx]:
+                    faster.set(key, results)
+                return results
+        return None
+
+    def set(self, key, results):
+        for tier in self.tiers:
+            tier.set(key, results)
@@ -0,0 +1,231 @@
+"""Decompression
+
+This module implements the incremental decompression used by HTTP services when
+their ``decompress`` setting is True. The compression format is detected from
+the magic bytes at the start of the body, and the body is decompressed chunk by
+chunk as it is read:
+
+.. code:: python
+
+    >>> import gzip
+    >>> b"".join(decompress([gzip.compress(b"hello "), gzip.compress(b"world")]))
+    b'hello world'
+
+gzip, bzip2 and xz bodies (including concatenated streams) are decompressed as
+they arrive, no more than ``chunk_size`` bytes at a time, so that a small
+compressed chunk cannot expand into an unbounded amount of memory. A body which
+ends part way through a stream raises EOFError.
+
+A zip archive can only be read once its central directory (at the end of the
+archive) has been received, so it is spooled to a temporary file first, and the
+contents of each of its members are then returned in turn. Bodies in any other
+format are returned unchanged.
+
+Support for further formats can be added to :data:`FORMATS`.
+"""
+import bz2
+import functools
+import tempfile
+import zlib
+
+
+class StreamDecoder(object):
+    """Decompresses a format made of one or more self-delimiting streams
+
+    Args:
+        factory (callable): Returns a new zlib, bz2 or lzma style decompressor
+            for each stream
+
+    Kwargs:
+        chunk_size (int): The maximum number of bytes returned at a time
+    """
+
+    def __init__(self, factory, chunk_size=64 * 1024):
+        self.factory = factory
+        self.chunk_size = chunk_size
+        self.decoder = factory()
+
+    def ended(self):
+        """True if the current stream is complete"""
+        # Python 2 decompressors lack the eof attribute
+        return getattr(self.decoder, "eof", bool(self.decoder.unused_data))
+
+    def feed(self, data):
+        """Iterate over the data decompressed from the next chunk of input"""
+        while data:
+            if self.ended():
+                # Streams may be separated by null padding
+                data = data.lstrip(b"\0")
+                if not data:
+                    break
+                self.decoder = self.factory()
+            for output in self._decompress(data):
+                yield output
+            data = self.decoder.unused_data if self.ended() else b""
+
+    def _decompress(self, data):
+        """Decompress data within the current stream, chunk_size bytes at a time"""
+        decoder = self.decoder
+        while True:
+            output = decoder.decompress(data, self.chunk_size)
+            if output:
+                yield output
+            if self.ended():
+                return
+            if hasattr(decoder, "unconsumed_tail"):
+                # zlib keeps the input it could not process yet
+                data = decoder.unconsumed_tail
+                if not data and len(output) < self.chunk_size:
+                    return
+            else:
+                # bz2 and lzma buffer it themselves
+                if decoder.needs_input:
+                    return
+                data = b""
+
+    def flush(self):
+        """Check that the input ended with a complete stream
+
+        Raises:
+            EOFError: If the input ended part way through a stream
+        """
+        if not self.ended():
+            raise EOFError("Compressed input ended before the end-of-stream marker "
+                           "was reached")
+        return iter(())
+
+
+class ZipDecoder(object):
+    """Spools a zip archive, then returns the contents of each member in turn
+
+    Kwargs:
+        chunk_size (int): The number of bytes returned at a time
+        spool_size (int): The size above which the archive is spooled to disk
+    """
+
+    def __init__(self, chunk_size=64 * 1024, spool_size=8 * 1024 * 1024):
+        self.chunk_size = chunk_size
+        self.spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+
+    def feed(self, data):
+        """Spool the next chunk of the archive"""
+        self.spool.write(data)
+        return ()
+
+    def flush(self):
+        """Iterate over the contents of each member of the archive"""
+        import zipfile
+
+        try:
+            self.spool.seek(0)
+            with zipfile.ZipFile(self.spool) as zfo:
+                for info in zfo.infolist():
+                    if info.filename.endswith("/"):
+                        continue
+                    with zfo.open(info) as fobj:
+                        for chunk in iter(functools.partial(fobj.read, self.chunk_size), b""):
+                            yield chunk
+        finally:
+            self.spool.close()
+
+
+class PlainDecoder(object):
+    """Returns uncompressed data unchanged"""
+
+    def feed(self, data):  # pylint: disable=no-self-use
+        """Return the next chunk of input"""
+        return (data,) if data else ()
+
+    def flush(self):  # pylint: disable=no-self-use
+        """There is never any remaining data"""
+        return iter(())
+
+
+def _xz_decoder(chunk_size=64 * 1024, **kwargs):  # pylint: disable=unused-argument
+    import lzma
+    return StreamDecoder(lzma.LZMADecompressor, chunk_size=chunk_size)
+
+
+FORMATS = [
+    (b"\x1f\x8b", "gzip", lambda chunk_size=64 * 1024, **kwargs: StreamDecoder(
+        lambda: zlib.decompressobj(16 + zlib.MAX_WBITS), chunk_size=chunk_size)),
+    (b"BZh", "bzip2", lambda chunk_size=64 * 1024, **kwargs: StreamDecoder(
+        bz2.BZ2Decompressor, chunk_size=chunk_size)),
+    (b"\xfd7zXZ\x00", "xz", _xz_decoder),
+    (b"PK\x03\x04", "zip", ZipDecoder),
+    (b"PK\x05\x06", "zip", ZipDecoder),
+]
+"""
+(signature, name, factory) for each supported format, where factory accepts the
+keyword arguments of :class:`Decompressor` and returns a decoder
+"""
+
+SNIFF_SIZE = max(len(signature) for (signature, _, _) in FORMATS)
+
+
+def sniff(head):
+    """Return the name of the format of a body starting with head, or None"""
+    for (signature, name, _) in FORMATS:
+        if head.startswith(signature):
+            return name
+    return None
+
+
+class Decompressor(object):
+    """Incrementally decompresses a body, detecting its format from its first bytes
+
+    Kwargs:
+        chunk_size (int): The number of bytes returned at a time from archives
+        spool_size (int): The size above which archives are spooled to disk
+    """
+
+    def __init__(self, chunk_size=64 * 1024, spool_size=8 * 1024 * 1024):
+        self.options = {"chunk_size": chunk_size, "spool_size": spool_size}
+        self.head = b""
+        self.format = None
+        self.decoder = None
+
+    def _start(self):
+        for (signature, name, factory) in FORMATS:
+            if self.head.startswith(signature):
+                self.format = name
+                self.decoder = factory(**self.options)
+                return
+        self.decoder = PlainDecoder()
+
+    def feed(self, data):
+        """Iterate over the data decompressed from the next chunk of the body"""
+        if self.decoder is None:
+            self.head += data
+            if len(self.head) < SNIFF_SIZE:
+                return ()
+            self._start()
+            (data, self.head) = (self.head, b"")
+        return self.decoder.feed(data)
+
+    def flush(self):
+        """Iterate over any data remaining once the whole body has been fed"""
+        if self.decoder is None:
+            self._start()
+            (data, self.head) = (self.head, b"")
+            for data in self.decoder.feed(data):
+                yield data
+        for data in self.decoder.flush():
+            yield data
+
+
+def decompress(chunks, **kwargs):
+    """Iterate over the decompressed chunks of a body
+
+    Args:
+        chunks (iterable): The byte strings making up the (possibly compressed) body
+
+    Kwargs:
+        Passed to :class:`Decompressor`
+    """
+    decompressor = Decompressor(**kwargs)
+    for chunk in chunks:
+        for data in decompressor.feed(chunk):
+            yield data
+    for data in decompressor.flush():
+        yield data
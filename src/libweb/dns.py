@@ -10,6 +10,11 @@ import dns.name
 import dns.resolver
 
 from . import WebService
+from .metrics import increment, timed_iter, timer
+from .records import record_type
+
+
+DnsRecord = record_type(("name", "type", "class", "ttl", "rdata"))
 
 
 class DnsService(WebService):
@@ -38,38 +43,93 @@ class DnsService(WebService):
             name = "{}.".format(name)
         return name
 
-    def make_requests(self):
-        """Iterate over the requests for this service and yield the rrsets"""
+    def get_async_resolver(self):
+        """Returns a dns.asyncresolver.Resolver configured like :meth:`get_resolver`
+
+        Requires dnspython 2.0 or later.
+        """
+        import dns.asyncresolver  # pylint: disable=redefined-outer-name
+        template = self.get_resolver()
+        resolver = dns.asyncresolver.Resolver(configure=False)
+        for attr in ("domain", "nameservers", "search", "port", "timeout", "lifetime",
+                     "ndots", "rotate", "flags", "edns", "ednsflags", "payload"):
+            if hasattr(template, attr):
+                setattr(resolver, attr, getattr(template, attr))
+        return resolver
+
+    def build_plan(self):
+        """Collect the configured rrname templates and record types"""
+        plan = super(DnsService, self).build_plan()
         query_list = self.conf
         if not isinstance(query_list, list):
             query_list = [query_list]
+        plan["queries"] = tuple((query["rrname"], query["rrtype"]) for query in query_list)
+        return plan
+
+    def _queries(self):
+        """Iterate over the configured queries, yielding (rrname, rrtype) pairs"""
+        for (rrname, rrtype) in self.plan["queries"]:
+            yield (self.get_rrname(rrname), rrtype)
+
+    def resolve(self, resolver, rrname, rrtype):
+        """Resolve a single query, coalescing it with any identical query in
+        flight if single_flight is set
+        """
+        if self.single_flight is None:
+            return resolver.query(rrname, rrtype)
+
+        key = ("dns", rrname, rrtype, tuple(resolver.nameservers),
+               getattr(resolver, "port", 53))
+        (rrset, shared) = self.single_flight.do(
+            key, lambda: resolver.query(rrname, rrtype))
+        if shared:
+            increment(self, "coalesced")
+        return rrset
 
-        for query in query_list:
-            rrname = self.get_rrname(query["rrname"])
-            rrtype = query["rrtype"]
+    def make_requests(self):
+        """Iterate over the requests for this service and yield the rrsets"""
+        for (rrname, rrtype) in self._queries():
             resolver = self.get_resolver()
             try:
-                rrset = resolver.query(rrname, rrtype)
+                with timer(self, "network"):
+                    rrset = self.resolve(resolver, rrname, rrtype)
             except dns.resolver.NXDOMAIN:
-                raise StopIteration
+                return
             else:
                 yield rrset
 
-    def get_results(self):
-        """Make the DNS requests and yield a structured response"""
-        for rrset in self.make_requests():
-            for rdata in rrset:
-                resp = rdata.to_text()
-
-                if rdata.rdtype == 16:
-                    resp = resp.strip('"')
-                    if self.conf.get("split", None):
-                        resp = resp.split(self.conf.get("split"))
-
-                if not isinstance(resp, list):
-                    resp = [resp]
+    def amake_requests(self):
+        """Asynchronous variant of :meth:`make_requests`, for use with ``async for``
 
-                for answer in resp:
+        Queries are resolved with :meth:`resolve` in the event loop's executor
+        if it is overridden or single_flight is set.
+        """
+        from .aio import dns_make_requests
+        native = self.single_flight is None and type(self).resolve is DnsService.resolve
+        return dns_make_requests(self, native=native)
+
+    def parse_response(self, rrset):
+        """Yield a structured response for each answer in a single rrset"""
+        return timed_iter(self, "extract", self.parse_rrset(rrset))
+
+    def parse_rrset(self, rrset):
+        """Build the structured responses for a single rrset"""
+        for rdata in rrset:
+            resp = rdata.to_text()
+
+            if rdata.rdtype == 16:
+                resp = resp.strip('"')
+                if self.conf.get("split", None):
+                    resp = resp.split(self.conf.get("split"))
+
+            if not isinstance(resp, list):
+                resp = [resp]
+
+            for answer in resp:
+                if self.compact_results:
+                    yield DnsRecord((rrset.name.to_text(), rdata.__class__.__name__, "IN",
+                                     rrset.ttl, answer))
+                else:
                     yield OrderedDict([
                         ("name", rrset.name.to_text()),
                         ("type", rdata.__class__.__name__),
@@ -78,6 +138,17 @@ class DnsService(WebService):
                         ("rdata", answer),
                     ])
 
+    def get_results(self):
+        """Make the DNS requests and yield a structured response"""
+        for rrset in self.make_requests():
+            for result in self.parse_response(rrset):
+                yield result
+
+    def aget_results(self):
+        """Asynchronous variant of :meth:`get_results`, for use with ``async for``"""
+        from .aio import dns_results
+        return dns_results(self)
+
 
 class DnsblService(DnsService):
     """A DNS-based service where the service options are reversed for use in a DNSBL
@@ -1,104 +1,133 @@
 """HTTP Services
 
 This module implements services using HTTP(s) for communication
+
+Third-party dependencies (requests, relatime, pytz and tzlocal) are imported on
+first use, to keep ``import libweb.http`` cheap.
 """
 # import datetime
-import gzip
+import copy
+import hashlib
 import io
+import itertools
+import json
+import mmap
+import tempfile
+import time
 import warnings
-import zipfile
-# from collections import OrderedDict
-
-import magic
-import pytz
-import relatime
-import requests
-from tzlocal import get_localzone
 try:
-    from requests.packages.urllib3 import exceptions  # pylint: disable=ungrouped-imports
+    from urllib.parse import urljoin, urlparse
 except ImportError:  # pragma nocover
-    # Apparently, some linux distros strip the packages out of requests
-    # I'm not going to tell you what I think of that, just going to deal with it
-    from urllib3 import exceptions
+    from urlparse import urljoin, urlparse
+# from collections import OrderedDict
 
-from . import __version__, WebService
+from . import __version__, batch, pool, ratelimit, retry, timeparams, WebService
+from .cache import cache_key
+from .compression import decompress, Decompressor
+from .metrics import increment, record, timer
+from .stream import open_buffer, open_chunks
+from .transport import RequestsTransport
 
 
-class HttpService(WebService):  # pylint: disable=abstract-method
+# Each hook is public so that subclasses can override it
+class HttpService(WebService):  # pylint: disable=abstract-method,too-many-public-methods
     """A simple service based on HTTP requests. This class should not be used directly"""
     _session = None
     user_agent = "python-libweb/{0}".format(__version__)
+    async_transport = "aiohttp"
+    """
+    Transport used by :meth:`amake_requests`. Either "aiohttp" (falling back to
+    "thread" when aiohttp is not installed) or "thread". Requests which need
+    :attr:`transport`, ``single_flight``, or the stream or spool settings are
+    always sent in a thread (see :mod:`libweb.aio`)
+    """
+    pool_registry = pool.registry
+    """
+    The :class:`libweb.pool.PoolRegistry` providing shared connection pools. When
+    None, each service instance uses its own pools
+    """
+    transport = RequestsTransport()
+    """
+    The :class:`libweb.transport.Transport` which prepares and sends requests,
+    e.g. :class:`libweb.transport.Urllib3Transport`
+    """
+    chunk_size = 64 * 1024
+    """The number of bytes read from the connection at a time when streaming"""
+    time_bucket = None
+    """
+    The number of seconds for which a resolved relatime parameter is reused (see
+    :mod:`libweb.timeparams`), or None to resolve it for every request. May be
+    overridden per parameter with "bucket"
+    """
+    http_cache = None
+    """
+    A :class:`libweb.cache.ResultCache` instance storing the validators (ETag and
+    Last-Modified) and extracted results of GET responses. When set, requests are
+    made conditional, and the results are replayed without downloading or parsing
+    the body again when the server responds 304 Not Modified. Disabled when None
+    """
+    plan_auth = None
+    """
+    If True, :meth:`get_auth` is called once, when the :attr:`plan` is built, and
+    its result is shared by every target. If False, it is called for every
+    request. If None, it is called once unless a subclass overrides get_auth,
+    which may depend on the options
+    """
 
     @property
     def session(self):
-        """Return a requests Session object which sets a User-Agent header"""
+        """Return a requests Session object which sets a User-Agent header, using
+        the shared connection pools configured by the "pool" setting
+        """
         if self._session is None:
+            import requests
             self._session = requests.Session()
             self._session.headers.update({"User-Agent": self.user_agent})
+            if self.pool_registry is not None:
+                self.pool_registry.mount(self._session, **self.conf.get("pool", {}))
             # if self.proxies:
             #     self._session.proxies = self.proxies
         return self._session
 
     def unzip_content(self, request, *args, **kwargs):  # pylint: disable=unused-argument
-        """Automatically detect and decompress zip or gzip content
-
-        Override this to provide support for additional compressed content types
-        """
-        content = request.content
-
-        with magic.Magic(flags=magic.MAGIC_MIME_TYPE) as magick:
-            mime = magick.id_buffer(content)
-
-        if mime == "application/zip":
-            self.logger.debug("Unzipping 'application/zip'")
-            zip_buffer = io.BytesIO(content)
-            with zipfile.ZipFile(zip_buffer) as zfo:
-                fname = zfo.namelist()[0]
-                with zfo.open(fname) as fobj:
-                    request.orig_content = fobj.read()
-        elif mime == "application/x-gzip":
-            self.logger.debug("Unzipping 'application/x-gzip'")
-            gz_buffer = io.BytesIO(content)
-            with gzip.GzipFile(fileobj=gz_buffer) as gzo:
-                request.orig_content = gzo.read()
-        else:
-            request.orig_content = content
+        """Automatically detect and decompress gzip, bzip2, xz or zip content,
+        storing the decompressed body as orig_content. Zip archives with several
+        members are decompressed to the contents of each member in turn.
 
+        Streamed responses are decompressed incrementally by :meth:`iter_body`
+        instead. Add to :data:`libweb.compression.FORMATS` to provide support
+        for additional compressed content types.
+        """
+        request.orig_content = b"".join(decompress([request.content],
+                                                   chunk_size=self.chunk_size))
         return request
 
-    def process_params(self, orig_params):  # pylint: disable=no-self-use
+    def process_params(self, orig_params):
         """Process parameters into usable pieces.
 
         Override this if you provide any config parameters that may require
         interpreation, such as the relatime parameter
         """
         params = orig_params.copy()
-        for (key, value) in params.items():
+        for (key, value) in orig_params.items():
             if hasattr(value, "items"):
                 conf = params.pop(key)
                 if "relatime" in conf:
-                    local_tz = get_localzone()
-
-                    dto = relatime.timeParser(conf["relatime"], timezone=str(local_tz))
-                    target_tz = pytz.timezone(conf.get("timezone", "UTC"))
-                    dto = dto.astimezone(target_tz)
-                    dto = dto.replace(tzinfo=None)
-                    time_format = conf.get("format", "%Y-%m-%dT%H:%M:%S.%fZ")
-                    if time_format.lower() == "as_epoch":
-                        try:
-                            timestamp = dto.timestamp()
-                        except AttributeError:
-                            import calendar
-                            timestamp = calendar.timegm(dto.timetuple())
-                        params[key] = str(int(timestamp))
-                    else:
-                        params[key] = dto.strftime(time_format)
+                    params[key] = timeparams.resolve(
+                        conf["relatime"],
+                        timezone=conf.get("timezone", "UTC"),
+                        time_format=conf.get("format", timeparams.DEFAULT_FORMAT),
+                        bucket=conf.get("bucket", self.time_bucket),
+                    )
         return params
 
     def get_auth(self, auth):
         """Find and apply authentication
 
-        Override this if you need to support additional styles of authentication
+        Override this if you need to support additional styles of authentication.
+        Overrides are called for every request, unless :attr:`plan_auth` is
+        True, in which case the result is computed once per :attr:`plan` and
+        reused for every target.
         """
         kwargs = dict()
         if auth and self.creds:
@@ -123,12 +152,59 @@ class HttpService(WebService):  # pylint: disable=abstract-method
                         kwargs["data"][key] = value
         return kwargs
 
+    def get_rate_limiter(self, url, conf):  # pylint: disable=no-self-use
+        """Return the shared token bucket which paces a request, or None
+
+        Buckets are keyed by the "key" of the rate_limit setting if given,
+        otherwise by the name of the credentials used, otherwise by the host.
+        Override this to share buckets differently.
+        """
+        limit = conf.get("rate_limit")
+        if not limit:
+            return None
+
+        key = limit.get("key")
+        if key is None:
+            auth = conf.get("auth")
+            if hasattr(auth, "items"):
+                auth = auth.get("name")
+            if auth:
+                key = "auth:{0}".format(auth)
+            else:
+                key = "host:{0}".format(urlparse(url).netloc)
+
+        return ratelimit.get_limiter(key, limit["rate"], per=limit.get("per", 1),
+                                     burst=limit.get("burst"))
+
+    def get_retry_policy(self, conf):  # pylint: disable=no-self-use
+        """Return the RetryPolicy configured by the retry setting, or None"""
+        policy = conf.get("retry")
+        if not policy:
+            return None
+        return retry.RetryPolicy(**policy)
+
+    def get_circuit_breaker(self, url, conf):  # pylint: disable=no-self-use
+        """Return the shared circuit breaker guarding a request, or None
+
+        Breakers are keyed by the "key" of the circuit_breaker setting if given,
+        otherwise by the host. Override this to share breakers differently.
+        """
+        breaker = conf.get("circuit_breaker")
+        if not breaker:
+            return None
+
+        key = breaker.get("key") or "host:{0}".format(urlparse(url).netloc)
+        return retry.get_breaker(key, threshold=breaker.get("threshold", 5),
+                                 reset_after=breaker.get("reset", 30.0))
+
     def build_request(self, url, method="GET", **kwargs):  # pylint: disable=no-self-use
         """Apply request hooks to automatically transform request content
 
         Override this if you need to customze the Request object generated.
         """
         hooks = kwargs.pop("hooks", [])
+        import requests
+
         request = requests.Request(method, url, **kwargs)
         for (event, hook) in hooks:
             request.register_hook(event, hook)
@@ -138,15 +214,27 @@ class HttpService(WebService):  # pylint: disable=abstract-method
         """Applies session state to the request"""
         return self.session.prepare_request(request)
 
-    def send_request(self, request, verify_ssl=True):
-        """Suppress SSL if necessary and send the request"""
+    def send_request(self, request, verify_ssl=True, stream=False):
+        """Suppress SSL if necessary and send the request
+
+        If stream is True, only the response headers are read before returning.
+        """
         with warnings.catch_warnings():
             if not verify_ssl:  # pragma nocover
+                try:
+                    from requests.packages.urllib3 import exceptions
+                except ImportError:
+                    # Apparently, some linux distros strip the packages out of requests
+                    # I'm not going to tell you what I think of that, just going to deal with it
+                    from urllib3 import exceptions
                 warnings.simplefilter("ignore", exceptions.InsecureRequestWarning)
-            return self.session.send(request, verify=verify_ssl)
+            return self.session.send(request, verify=verify_ssl, stream=stream)
 
-    def _req(self, url, **conf):
-        """Helper function for assembling and submitting requests"""
+    def _prepare(self, url, auth_kwargs=None, **conf):
+        """Helper function for assembling a prepared request
+
+        auth_kwargs may be given to reuse the result of a previous call to get_auth
+        """
         kwargs = {
             "headers": {},
             "data": {},
@@ -158,10 +246,14 @@ class HttpService(WebService):  # pylint: disable=abstract-method
         for key in kwargs:
             func = getattr(self, "process_{}".format(key), None)
             kwargs[key] = conf.get(key, {})
+            if hasattr(kwargs[key], "items"):
+                kwargs[key] = dict(kwargs[key])
             if callable(func):
                 kwargs[key] = func(kwargs[key])  # pylint: disable=not-callable
 
-        for (key, value) in self.get_auth(conf.get("auth", {})).items():
+        if auth_kwargs is None:
+            auth_kwargs = self.get_auth(conf.get("auth", {}))
+        for (key, value) in auth_kwargs.items():
             if hasattr(value, "items"):
                 # if key not in kwargs:
                 #     kwargs[key] = dict()
@@ -172,33 +264,691 @@ class HttpService(WebService):  # pylint: disable=abstract-method
         kwargs = {key: value for (key, value) in kwargs.items() if value}
 
         kwargs["hooks"] = list()
+        if conf.get("json") is not None:
+            kwargs["json"] = conf["json"]
+
+        return self.transport.prepare(self, url, kwargs)
+
+    def _receive(self, response, conf):
+        """Count a received response and decompress it if configured to"""
+        if getattr(response, "coalesced", False):
+            increment(self, "coalesced")
+        else:
+            increment(self, "requests")
+        # pylint: disable=protected-access
+        if self.streamed(conf) and response._content is False:
+            response.streaming = True
+            response.decompress = conf.get("decompress", False)
+            if conf.get("spool") and not conf.get("stream", False):
+                self._spool(response, conf["spool"])
+            return response
+
+        if not getattr(response, "coalesced", False):
+            increment(self, "bytes", len(response.content))
         if conf.get("decompress", False):
-            kwargs["hooks"].append(("response", self.unzip_content))
+            with timer(self, "decompress"):
+                response = self.unzip_content(response)
+        return response
 
-        raw_request = self.build_request(url, **kwargs)
-        request = self.prepare_request(raw_request)
-        return self.send_request(request, verify_ssl=conf.get("verify_ssl", True))
+    def _req(self, url, **conf):
+        """Helper function for assembling and submitting requests"""
+        limiter = self.get_rate_limiter(url, conf)
+        breaker = self.get_circuit_breaker(url, conf)
+        policy = self.get_retry_policy(conf)
+        attempt = 0
 
-    def make_requests(self):
-        """Iterate over configuration for multiple requests"""
-        query = self.conf
+        while True:
+            if limiter is not None:
+                with timer(self, "throttle"):
+                    limiter.acquire()
+
+            with timer(self, "network"):
+                request = self._prepare(url, **conf)
+                revalidation = self._revalidate(request, conf)
+                if breaker is not None:
+                    breaker.check()
+                try:
+                    response = self._send(request, conf)
+                except Exception as exc:  # pylint: disable=broad-except
+                    delay = self._attempted(breaker, policy, attempt, request.method,
+                                            retryable=self._retryable(exc))
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._attempted(breaker, policy, attempt, request.method, response)
+                    if delay is None:
+                        break
+                    response.close()
+
+            attempt += 1
+            self.logger.debug("Retrying %s in %.2f seconds", url, delay)
+            with timer(self, "backoff"):
+                time.sleep(delay)
+
+        self._revalidated(response, revalidation)
+        return self._receive(response, conf)
+
+    def _send(self, request, conf):
+        """Send a prepared request with the transport, coalescing it with any
+        identical request in flight if single_flight is set
+        """
+        verify_ssl = conf.get("verify_ssl", True)
+        stream = self.streamed(conf)
+        if self.single_flight is None or stream:
+            return self.transport.send(self, request, verify_ssl=verify_ssl, stream=stream)
+
+        key = ("http", request.method, request.url, request.body,
+               tuple(sorted(request.headers.items())), verify_ssl)
+        (response, shared) = self.single_flight.do(
+            key, lambda: self.transport.send(self, request, verify_ssl=verify_ssl))
+        # Each caller gets its own copy, as services annotate their responses
+        response = copy.copy(response)
+        response.coalesced = shared
+        return response
+
+    def streamed(self, conf):  # pylint: disable=no-self-use
+        """True if the body of a request made with conf is read as it is parsed,
+        i.e. if the stream or spool setting is given
+        """
+        return bool(conf.get("stream", False) or conf.get("spool"))
+
+    @staticmethod
+    def _retryable(exc):
+        """True if a request which raised exc may be retried"""
+        # pylint: disable=redefined-builtin
+        from requests.exceptions import ConnectionError, Timeout
+
+        return isinstance(exc, (ConnectionError, Timeout))
+
+    @staticmethod
+    def _attempted(breaker, policy, attempt, method, response=None, retryable=True):
+        """Record the outcome of an attempt with the circuit breaker, and return
+        the number of seconds to wait before retrying it, or None to give up
+
+        response is None if the attempt raised an exception.
+        """
+        # pylint: disable=too-many-arguments
+        if breaker is not None:
+            if response is None or response.status_code >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+        if policy is None or not retryable:
+            return None
+        return policy.delay(attempt, method, response)
+
+    def _revalidate(self, request, conf):
+        """Make a GET request conditional on the validators of a cached response
+
+        Returns a (key, entry) pair for :meth:`_revalidated`, where entry is the
+        cached [validators, results] pair, or None. Paginated requests are never
+        conditional, as an unmodified page does not reveal the page after it.
+        """
+        if self.http_cache is None or request.method != "GET" or conf.get("paginate"):
+            return (None, None)
+
+        ident = [self.cache_key(), request.url, sorted(request.headers.items())]
+        data = json.dumps(ident, default=repr, separators=(",", ":"))
+        key = hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+        entry = self.http_cache.get(key)
+        if entry is not None:
+            (validators, _) = entry
+            if validators.get("etag"):
+                request.headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                request.headers["If-Modified-Since"] = validators["last_modified"]
+        return (key, entry)
+
+    def _revalidated(self, response, revalidation):
+        """Note the cached results to replay, or the key to cache results under"""
+        (key, entry) = revalidation
+        if key is None:
+            return
+        if response.status_code == 304 and entry is not None:
+            response.cached_results = entry[1]
+        else:
+            response.http_cache_key = key
+
+    def _store_results(self, response, results):
+        """Cache the results extracted from a response which has validators"""
+        key = getattr(response, "http_cache_key", None)
+        if key is None:
+            return
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if validators["etag"] or validators["last_modified"]:
+            self.http_cache.set(key, [validators, list(results)])
+
+    def _conditional_results(self, response):
+        """Parse a single response, or replay its cached results if it was not modified"""
+        cached = getattr(response, "cached_results", None)
+        if cached is not None:
+            # A streamed 304 still holds its connection
+            self.release_body(response)
+            increment(self, "not_modified")
+            for result in cached:
+                yield result
+            return
+
+        try:
+            if getattr(response, "http_cache_key", None) is None:
+                for result in self.parse_response(response):
+                    yield result
+                return
+
+            results = list()
+            for result in self.parse_response(response):
+                results.append(result)
+                yield result
+            self._store_results(response, results)
+        finally:
+            self.release_body(response)
+
+    def _spool(self, response, threshold):
+        """Read a streamed body (decompressing it, if configured to), keeping it
+        in memory as orig_content if it is no larger than threshold bytes, or
+        else writing it to a temporary file, which is memory-mapped as body_map
+        """
+        chunks = list()
+        size = 0
+        spool = None
+        try:
+            for chunk in self.iter_body(response):
+                if spool is None:
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size <= threshold:
+                        continue
+                    spool = tempfile.TemporaryFile()
+                    (chunk, chunks) = (b"".join(chunks), None)
+                spool.write(chunk)
+
+            if spool is None:
+                response.orig_content = b"".join(chunks)
+            else:
+                spool.flush()
+                response.body_map = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            if spool is not None:
+                spool.close()
+
+    def release_body(self, response):  # pylint: disable=no-self-use
+        """Release the resources of a response once it has been parsed, rather
+        than leaving them until the response is collected
+
+        The connection of a streamed response which was not read to the end is
+        released, and the memory-mapped file of a spooled response is closed.
+        """
+        if getattr(response, "raw", None) is not None:
+            response.streaming = False
+            response.close()
+        body_map = getattr(response, "body_map", None)
+        if body_map is None:
+            return
+        del response.body_map
+        try:
+            body_map.close()
+        except BufferError:
+            # A file object from open_body is still open, so the map is closed
+            # when that is collected
+            pass
+
+    def iter_body(self, response):
+        """Iterate over the body of a response in chunks
+
+        Streamed responses are read from the connection (and decompressed, if
+        configured to) as the chunks are consumed, and can only be read once.
+        """
+        body_map = getattr(response, "body_map", None)
+        if body_map is not None:
+            for offset in range(0, len(body_map), self.chunk_size):
+                yield body_map[offset:offset + self.chunk_size]
+            return
+        if not getattr(response, "streaming", False):
+            yield self.read_body(response)
+            return
+
+        response.streaming = False
+        chunks = self._read_chunks(response)
+        if getattr(response, "decompress", False):
+            chunks = self._decompress_chunks(chunks)
+        for chunk in chunks:
+            yield chunk
+
+    def _read_chunks(self, response):
+        """Read a streamed body from the connection, then release the connection"""
+        try:
+            for chunk in response.iter_content(self.chunk_size):
+                increment(self, "bytes", len(chunk))
+                yield chunk
+        finally:
+            response.close()
+
+    def _decompress_chunks(self, chunks):
+        """Decompress streamed chunks, recording the time taken as the decompress phase"""
+        decompressor = Decompressor(chunk_size=self.chunk_size)
+
+        def batches():
+            for chunk in chunks:
+                yield decompressor.feed(chunk)
+            yield decompressor.flush()
 
-        url_list = query.pop("url")
+        elapsed = 0.0
+        try:
+            # Reading the chunks from the connection is not counted
+            for pieces in batches():
+                pieces = iter(pieces)
+                while True:
+                    start = time.time()
+                    data = next(pieces, None)
+                    elapsed += time.time() - start
+                    if data is None:
+                        break
+                    yield data
+        finally:
+            record(self, "decompress", elapsed)
+
+    def open_body(self, response):
+        """Return a file object reading the body of a response
+
+        Spooled bodies are read straight from the memory-mapped file.
+        """
+        body_map = getattr(response, "body_map", None)
+        if body_map is not None:
+            return open_buffer(body_map, buffer_size=self.chunk_size)
+        if not getattr(response, "streaming", False):
+            return io.BytesIO(self.read_body(response))
+        return open_chunks(self.iter_body(response), buffer_size=self.chunk_size)
+
+    def read_body(self, response):
+        """Return the complete (decompressed, if configured to) body of a response
+
+        This copies a spooled body into memory, so parsers which can read a
+        file object should use :meth:`open_body` instead.
+        """
+        body_map = getattr(response, "body_map", None)
+        if body_map is not None:
+            return body_map[:]
+        if not getattr(response, "streaming", False):
+            if hasattr(response, "orig_content"):
+                return response.orig_content
+            return response.content
+        return b"".join(self.iter_body(response))
+
+    def read_text(self, response):
+        """Return the complete body of a response, decoded to text
+
+        Streamed, spooled or decompressed responses which do not declare a
+        charset are decoded as UTF-8. Spooled bodies are decoded straight from
+        the memory-mapped file, but the text is still held in memory in full,
+        so spooling does not bound the memory used by parsers which need text.
+        """
+        body_map = getattr(response, "body_map", None)
+        if body_map is not None:
+            return str(body_map, response.encoding or "utf-8", "replace")
+        if getattr(response, "streaming", False) or hasattr(response, "orig_content"):
+            return self.read_body(response).decode(response.encoding or "utf-8", "replace")
+        return response.text
+
+    def build_plan(self):
+        """Split the configuration into URL templates, setting templates, and the
+        static settings and authentication shared by every request
+        """
+        plan = super(HttpService, self).build_plan()
+
+        url_list = self.conf.get("url", [])
         if not isinstance(url_list, list):
             url_list = [url_list]
+        plan["urls"] = tuple(url_list)
+
+        plan["query"] = dict((key, value) for (key, value) in self.conf.items()
+                             if key != "url")
+        paginate = self.conf.get("paginate") or {}
+        if paginate.get("page_size_param") and paginate.get("page_size") is not None:
+            plan["query"]["params"] = dict(plan["query"].get("params") or {})
+            plan["query"]["params"][paginate["page_size_param"]] = paginate["page_size"]
+        plan["templates"] = dict()
+        for key in ("params", "data", "headers"):
+            settings = self.conf.get(key)
+            if not hasattr(settings, "items"):
+                continue
+            plan["templates"][key] = tuple(
+                (setting, value) for (setting, value) in settings.items()
+                if hasattr(value, "format") and "{" in value
+            )
+
+        plan_auth = self.plan_auth
+        if plan_auth is None:
+            plan_auth = type(self).get_auth is HttpService.get_auth
+        if plan_auth:
+            plan["auth"] = self.get_auth(self.conf.get("auth", {}))
+        else:
+            plan["auth"] = None
+        return plan
+
+    def _queries(self):
+        """Iterate over configuration for multiple requests, yielding (url, conf) pairs
+
+        Each conf is a new dictionary, rendered from the compiled :attr:`plan`
+        with the service's options.
+        """
+        plan = self.plan
 
-        for url in url_list:
-            url = url.format(**self.opts)
+        for url in plan["urls"]:
+            query = dict(plan["query"])
+            query["auth_kwargs"] = plan["auth"]
+            for (key, templates) in plan["templates"].items():
+                if templates:
+                    query[key] = dict(query[key])
+                    for (setting, template) in templates:
+                        query[key][setting] = template.format(**self.opts)
 
-            for key in ("params", "data", "headers"):  # pragma nocover
-                if key in query:
-                    settings = query.pop(key)
-                    for (setting, value) in settings.items():
-                        settings.update({setting: value.format(**self.opts)})
-                    query[key] = settings
+            yield (url.format(**self.opts), query)
 
-            request = self._req(url, **query)
-            ignored_status_codes = [int(sc) for sc in query.get("ignored_status_codes", [])]
-            if request.status_code not in ignored_status_codes:
+    @staticmethod
+    def _check_status(request, query):
+        """Raise for error status codes, unless they are configured to be ignored
+
+        The connection of a streamed response is released before raising.
+        """
+        ignored_status_codes = [int(sc) for sc in query.get("ignored_status_codes", [])]
+        if request.status_code not in ignored_status_codes:
+            try:
                 request.raise_for_status()
-            yield request
+            except Exception:
+                request.close()
+                raise
+
+    def next_page(self, response, paginate):  # pylint: disable=no-self-use
+        """Return the URL or cursor of the page following a response, or None
+
+        Uses the "header" of the paginate setting, where "Link" follows the
+        rel="next" link. Override this to find the next page elsewhere.
+        """
+        header = paginate.get("header")
+        if header is None:
+            return None
+        if header.lower() == "link":
+            return response.links.get("next", {}).get("url")
+        return response.headers.get(header)
+
+    def _next_query(self, url, response, query, pages):
+        """Return the (url, conf) of the page following a response, or None
+
+        If the paginate setting has a "cursor_param", the next page is requested
+        from the original URL with the cursor in that parameter. Otherwise, the
+        next page is a URL (relative to the response), which already carries
+        the query string, so the configured params are not sent again.
+        """
+        paginate = query.get("paginate")
+        if not paginate or pages >= paginate.get("max_pages", float("inf")):
+            return None
+        value = self.next_page(response, paginate)
+        if not value:
+            return None
+
+        query = dict(query)
+        cursor_param = paginate.get("cursor_param")
+        if cursor_param:
+            params = query.get("params") or {}
+            if params.get(cursor_param) == value:
+                return None
+            query["params"] = dict(params)
+            query["params"][cursor_param] = value
+            return (url, query)
+
+        next_url = urljoin(response.url, value)
+        if next_url == response.url:
+            return None
+        query.pop("params", None)
+        return (next_url, query)
+
+    def _pages(self, url, query):
+        """Request each page of a query, following the paginate setting
+
+        Unless prefetch is disabled, each page is requested in the background
+        while the one before it is being consumed.
+        """
+        response = self._req(url, **query)
+        self._check_status(response, query)
+
+        executor = None
+        future = None
+        pages = 1
+        try:
+            while True:
+                following = self._next_query(url, response, query, pages)
+                if following is None:
+                    yield response
+                    return
+                (url, query) = following
+
+                if query["paginate"].get("prefetch", True):
+                    if executor is None:
+                        from concurrent import futures
+                        executor = futures.ThreadPoolExecutor(max_workers=1)
+                    future = executor.submit(self._req, url, **query)
+                    yield response
+                    response = future.result()
+                    future = None
+                else:
+                    yield response
+                    response = self._req(url, **query)
+                self._check_status(response, query)
+                pages += 1
+        finally:
+            # Release the connection of a page prefetched for a consumer which
+            # stopped early
+            if future is not None and not future.cancel():
+                try:
+                    future.result().close()
+                except Exception:  # pylint: disable=broad-except
+                    pass
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _parallel_pages(self, parallel):
+        """Request every URL concurrently, yielding each URL's pages together
+
+        The "workers" of the parallel setting bounds the number of URLs fetched
+        at once. Responses are yielded in the order the URLs are configured,
+        unless the "order" is "completion".
+        """
+        from concurrent import futures
+
+        # Create the session before the workers share it
+        self.session  # pylint: disable=pointless-statement
+        executor = futures.ThreadPoolExecutor(max_workers=parallel.get("workers", 4))
+        submitted = list()
+        finished = False
+        try:
+            for (url, query) in self._queries():
+                submitted.append(executor.submit(
+                    lambda url, query: list(self._pages(url, query)), url, query))
+            pending = submitted
+            if parallel.get("order", "original") == "completion":
+                pending = futures.as_completed(submitted)
+            for future in pending:
+                for response in future.result():
+                    yield response
+            finished = True
+        finally:
+            if not finished:
+                # Release the connections of URLs the consumer will not read,
+                # once any which are still being fetched complete
+                for future in submitted:
+                    if not future.cancel():
+                        future.add_done_callback(self._close_responses)
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _close_responses(future):
+        """Close the responses returned by a future, if it succeeded"""
+        if future.exception() is None:
+            for response in future.result():
+                response.close()
+
+    def make_requests(self):
+        """Iterate over configuration for multiple requests, following pagination
+
+        With the parallel setting, multiple URLs are requested concurrently.
+        """
+        parallel = self.conf.get("parallel")
+        if parallel and len(self.plan["urls"]) > 1:
+            for request in self._parallel_pages(parallel):
+                yield request
+            return
+
+        for (url, query) in self._queries():
+            for request in self._pages(url, query):
+                yield request
+
+    def amake_requests(self):
+        """Asynchronous variant of :meth:`make_requests`, for use with ``async for``
+
+        Requests are sent with aiohttp when it is installed and
+        :attr:`async_transport` is ``"aiohttp"``, otherwise the blocking
+        transport is run in the event loop's executor.
+        """
+        from .aio import http_make_requests
+        return http_make_requests(self)
+
+    def parse_response(self, request):  # pylint: disable=no-self-use
+        """Parse a single response and yield structured results
+
+        Note:
+            This method must be implemented by subclasses, there is no default
+            behavior.
+        """
+        raise NotImplementedError
+
+    def get_results(self):
+        """Make the HTTP requests and yield the results parsed from each response
+
+        With the batch setting, the request is batched with those of other
+        threads (see :mod:`libweb.batch`).
+        """
+        settings = self.conf.get("batch")
+        if settings:
+            value = str(self.opts[settings["option"]])
+            for result in self.get_batcher().submit(value, self._batch_results):
+                yield result
+            return
+
+        for request in self.make_requests():
+            for result in self._conditional_results(request):
+                yield result
+
+    def aget_results(self):
+        """Asynchronous variant of :meth:`get_results`, for use with ``async for``"""
+        if self.conf.get("batch"):
+            from .aio import threaded_results
+            return threaded_results(self)
+        from .aio import http_results
+        return http_results(self)
+
+    def _batch_opts(self, opts):
+        """Return the options shared by a batch, i.e. all but the batched option"""
+        option = self.conf["batch"]["option"]
+        return dict((key, value) for (key, value) in opts.items() if key != option)
+
+    def _batch_key(self, opts):
+        """Return the key of the batches which a target with opts may join
+
+        The key always covers the configuration, credentials and other options,
+        even if :meth:`cache_key` is overridden, as they all affect the request.
+        """
+        return cache_key(self.bind(self._batch_opts(opts)))
+
+    def get_batcher(self):
+        """Return the shared batcher collecting targets for this service
+
+        Targets are only batched together if all of their other options (and
+        the configuration and credentials) are the same.
+        """
+        settings = self.conf["batch"]
+        key = self._batch_key(self.opts)
+        return batch.get_batcher(key, size=settings.get("size", 100),
+                                 wait=settings.get("wait", 0.05))
+
+    def _batch_results(self, values):
+        """Make a batched request for values, returning the results of each value"""
+        settings = self.conf["batch"]
+        opts = self._batch_opts(self.opts)
+        opts[settings["option"]] = settings.get("separator", ",").join(values)
+        service = self.bind(opts)
+
+        body = settings.get("json")
+        results = list()
+        # pylint: disable=protected-access
+        for (url, query) in service._queries():
+            if body is True:
+                query["json"] = list(values)
+            elif body:
+                query["json"] = {body: list(values)}
+            for request in service._pages(url, query):
+                results.extend(service._conditional_results(request))
+        # pylint: enable=protected-access
+        increment(self, "batched", len(values))
+        return batch.demultiplex(values, results, settings["key"])
+
+    def _batch_groups(self, targets):
+        """Split targets into groups of up to "size" targets which share a batch key"""
+        size = self.conf["batch"].get("size", 100)
+        pending = dict()
+        for opts in targets:
+            key = self._batch_key(opts)
+            group = pending.setdefault(key, list())
+            group.append(opts)
+            if len(group) >= size:
+                yield pending.pop(key)
+        for group in pending.values():
+            yield group
+
+    def _run_batch(self, group):
+        """Make the batched request for a group of targets, returning the results
+        of each target's value
+        """
+        values = [str(opts[self.conf["batch"]["option"]]) for opts in group]
+        try:
+            return self.bind(group[0])._batch_results(values)  # pylint: disable=protected-access
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error(str(exc))
+            if not self.swallow_exceptions:
+                raise
+            return dict()
+
+    def map(self, targets, concurrency=4):
+        """Run this service's configuration against many targets concurrently
+
+        With the batch setting, targets are split into batches of up to "size"
+        targets with the same other options, and ``concurrency`` batched
+        requests are made at a time. Results are then not cached.
+        """
+        settings = self.conf.get("batch")
+        if not settings:
+            for item in super(HttpService, self).map(targets, concurrency=concurrency):
+                yield item
+            return
+
+        from concurrent import futures
+
+        groups = self._batch_groups(targets)
+        with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = dict()
+            while True:
+                for group in itertools.islice(groups, concurrency - len(pending)):
+                    pending[executor.submit(self._run_batch, group)] = group
+                if not pending:
+                    break
+
+                done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    group = pending.pop(future)
+                    results = future.result()
+                    for opts in group:
+                        for result in results.get(str(opts[settings["option"]]), []):
+                            yield (opts, result)
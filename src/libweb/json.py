@@ -4,12 +4,14 @@ This module implements services using JSON over HTTP for communication
 """
 from __future__ import absolute_import
 
+import io
 import json
 from collections import OrderedDict
 
-import jsonpath_rw_ext
-
+from . import jsonpath, jsonstream
 from .http import HttpService
+from .metrics import timed_iter, timer
+from .records import record_type
 
 
 class JsonService(HttpService):
@@ -18,45 +20,207 @@ class JsonService(HttpService):
 
     Keyword arguments:
         jsonpath (dict or list of dicts): JSONpath configuration to extract/parse data
+        items (str): JSONpath of the items of each document to extract data from
+        multi_json (bool): If True, each line of a response is a separate document.
+            Responses are then always streamed, so that each line is decoded
+            as soon as it has been received
     """
 
-    def get_data(self):
-        """Make the HTTP requests and yield the data returned"""
-        ignored_status_codes = [int(sc) for sc in self.conf.get("ignored_status_codes", [])]
+    def build_plan(self):
+        """Compile the configured jsonpath expressions (see :mod:`libweb.jsonpath`)"""
+        plan = super(JsonService, self).build_plan()
+        jsonpaths = self.conf.get("jsonpath")
+        if jsonpaths is not None and not isinstance(jsonpaths, list):
+            jsonpaths = [jsonpaths]
+        if jsonpaths is not None:
+            plan["jsonpaths"] = tuple(
+                tuple((key, jsonpath.parse(expression))
+                      for (key, expression) in jsonpath_conf.items())
+                for jsonpath_conf in jsonpaths
+            )
+            plan["records"] = tuple(record_type(key for (key, _) in jsonpath_conf)
+                                    for jsonpath_conf in plan["jsonpaths"])
+        else:
+            plan["jsonpaths"] = None
+        paginate = self.conf.get("paginate") or {}
+        if paginate.get("next"):
+            plan["next_page"] = jsonpath.parse(paginate["next"])
+        else:
+            plan["next_page"] = None
+        plan["items"] = None
+        plan["item_fields"] = None
+        if self.conf.get("items"):
+            plan["items"] = jsonpath.parse(self.conf["items"])
+            try:
+                plan["item_fields"] = jsonstream.parse_path(self.conf["items"])
+            except ValueError:
+                pass
+        batch = self.conf.get("batch") or {}
+        if batch.get("items"):
+            plan["batch_items"] = jsonpath.parse(batch["items"])
+        else:
+            plan["batch_items"] = None
+        plan["ignored_status_codes"] = frozenset(
+            int(sc) for sc in self.conf.get("ignored_status_codes", []))
+        return plan
 
-        for request in self.make_requests():
-            if request.status_code in ignored_status_codes:
-                raise StopIteration
+    def streamed(self, conf):
+        """True if the stream or spool setting is given, or with multi_json"""
+        return (super(JsonService, self).streamed(conf)
+                or bool(conf.get("multi_json", False)))
 
+    def decode_response(self, request):
+        """Decode the JSON document(s) in a single response
+
+        Yields nothing if the response status code is configured to be ignored.
+        With multi_json, each line is a separate document, which is decoded and
+        yielded as soon as it has been read.
+
+        If the "items" setting is a jsonpath, each value it matches is yielded
+        as a separate document. Streamed or spooled bodies are then parsed
+        incrementally (see :mod:`libweb.jsonstream`), if the path is simple
+        enough, so that each item is yielded as soon as it has been received.
+        Similarly, if the batch setting has an "items" jsonpath, each item it
+        matches is yielded as a separate document, so that results can be split
+        by target.
+        """
+        if request.status_code in self.plan["ignored_status_codes"]:
+            # Release the connection of a streamed response, which is not read
+            request.close()
+            return
+        multi_json = self.conf.get("multi_json", False)
+        if multi_json and hasattr(request, "decoded"):
+            documents = request.decoded
+        elif multi_json:
+            documents = timed_iter(self, "parse", self._iter_lines(request))
+        elif self.plan["items"] is None:
+            documents = [self._decode(request)]
+        elif self._incremental(request):
+            documents = timed_iter(self, "parse", self._iter_items(request))
+        else:
+            documents = self.plan["items"].values(self._decode(request))
+
+        for data in documents:
+            if multi_json and self.plan["items"] is not None:
+                items = self.plan["items"].values(data)
+            else:
+                items = [data]
+            for item in items:
+                if self.plan["batch_items"] is None:
+                    yield item
+                    continue
+                for batch_item in self.plan["batch_items"].values(item):
+                    yield batch_item
+
+    def _open_text(self, request):
+        """Return a text file object reading the body of a response"""
+        if (getattr(request, "streaming", False) or hasattr(request, "orig_content")
+                or getattr(request, "body_map", None) is not None):
+            return io.TextIOWrapper(self.open_body(request),
+                                    encoding=request.encoding or "utf-8")
+        return io.StringIO(request.text)
+
+    def _iter_lines(self, request):
+        """Decode each line of a multi_json body as it is read"""
+        with self._open_text(request) as body:
+            for line in body:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _incremental(self, request):
+        """True if the items of a response can be parsed incrementally"""
+        if self.plan["item_fields"] is None or hasattr(request, "decoded"):
+            return False
+        return (getattr(request, "streaming", False)
+                or getattr(request, "body_map", None) is not None)
+
+    def _iter_items(self, request):
+        """Parse the items of a streamed or spooled body as they are received"""
+        with self._open_text(request) as body:
+            for item in jsonstream.iter_items(body, self.plan["item_fields"],
+                                              chunk_size=self.chunk_size):
+                yield item
+
+    def _decode(self, request):
+        """Decode a response once, keeping the result on the response"""
+        if hasattr(request, "decoded"):
+            return request.decoded
+
+        with timer(self, "parse"):
             if self.conf.get("multi_json", False):
-                yield [json.loads(line) for line in request.text.split("\n") if line]
+                data = list(self._iter_lines(request))
+            elif (getattr(request, "streaming", False) or hasattr(request, "orig_content")
+                  or getattr(request, "body_map", None) is not None):
+                with self._open_text(request) as body:
+                    data = json.load(body)
             else:
-                yield request.json()
+                data = request.json()
+        request.decoded = data
+        return data
+
+    def next_page(self, response, paginate):
+        """Return the URL or cursor of the page following a response, or None
+
+        Uses the "next" jsonpath of the paginate setting, if given, or else the
+        "header" (see :meth:`HttpService.next_page`).
+        """
+        expr = self.plan["next_page"]
+        if expr is None:
+            return super(JsonService, self).next_page(response, paginate)
+        if response.status_code in self.plan["ignored_status_codes"]:
+            return None
+        for value in expr.values(self._decode(response)):
+            if value is not None:
+                return str(value)
+        return None
+
+    def get_data(self):
+        """Make the HTTP requests and yield the data returned"""
+        for request in self.make_requests():
+            for data in self.decode_response(request):
+                yield data
+            self.release_body(request)
 
     def get_results(self):
-        """Parse the JSON and yield a structured response"""
-        # pylint: disable=too-many-nested-blocks
+        """Make the HTTP requests and yield the results parsed from each response
+
+        If a subclass overrides :meth:`get_data`, the results are parsed from
+        the documents it yields instead, bypassing the HTTP cache and batching.
+        """
+        if type(self).get_data is JsonService.get_data:
+            return super(JsonService, self).get_results()
+        return self._data_results()
+
+    def _data_results(self):
+        """Apply the configured jsonpath expressions to each document from get_data"""
         for data in self.get_data():
-            if "jsonpath" in self.conf:
-                jsonpaths = self.conf["jsonpath"]
-                if not isinstance(jsonpaths, list):
-                    jsonpaths = [jsonpaths]
-                for jsonpath_conf in jsonpaths:
-                    new_data = OrderedDict()
-                    for (key, jsonpath) in jsonpath_conf.items():
-                        expr = jsonpath_rw_ext.parse(jsonpath)
-                        for match in expr.find(data):
-                            if key in new_data:
-                                if not isinstance(new_data[key], list):
-                                    new_data[key] = [new_data[key]]
-                                new_data[key].append(match.value)
-                            else:
-                                new_data.update({key: match.value})
-                            # print(new_data)
-                    yield new_data
-            else:
-                if self.conf.get("multi_json", False):
-                    for result in data:
-                        yield result
+            for result in timed_iter(self, "extract", self.parse_data(data)):
+                yield result
+
+    def parse_data(self, data):
+        """Apply the configured jsonpath expressions to a decoded document"""
+        # pylint: disable=too-many-nested-blocks
+        jsonpaths = self.plan["jsonpaths"]
+        if jsonpaths is not None:
+            for (jsonpath_conf, record) in zip(jsonpaths, self.plan["records"]):
+                new_data = OrderedDict()
+                for (key, expr) in jsonpath_conf:
+                    for value in expr.values(data):
+                        if key in new_data:
+                            if not isinstance(new_data[key], list):
+                                new_data[key] = [new_data[key]]
+                            new_data[key].append(value)
+                        else:
+                            new_data.update({key: value})
+                if self.compact_results:
+                    yield record(new_data.get(key) for (key, _) in jsonpath_conf)
                 else:
-                    yield data
+                    yield new_data
+        else:
+            yield data
+
+    def parse_response(self, request):
+        """Decode a single response and yield a structured response"""
+        for data in self.decode_response(request):
+            for result in timed_iter(self, "extract", self.parse_data(data)):
+                yield result
@@ -0,0 +1,132 @@
+"""Compiled JSONPath Expressions
+
+This module compiles the jsonpath expressions used by JSON services. Parsing an
+expression with jsonpath_rw_ext is slow, so each expression is parsed at most
+once per process, and shared by every service using it:
+
+.. code:: python
+
+    >>> parse("$.data[*].name").values({"data": [{"name": "a"}, {"name": "b"}]})
+    ['a', 'b']
+
+Simple expressions, made of a root (``$``) followed only by field names
+(``.name``), indexes (``[0]``) and wildcards (``[*]``), are evaluated by walking
+the document directly, with the same results as jsonpath_rw_ext. Any other
+expression is evaluated by jsonpath_rw_ext.
+"""
+import re
+import threading
+
+
+MAX_ENTRIES = 1024
+
+_STEP = r"\.[A-Za-z_][A-Za-z0-9_]*|\[\*\]|\[\d+\]"
+_SIMPLE = re.compile(r"^\$((?:{0})*)$".format(_STEP))
+_STEPS = re.compile(_STEP)
+_RESERVED = frozenset((".where",))
+
+_compiled = dict()
+_lock = threading.Lock()
+
+
+def _field(value, name):
+    """The value of a field, as jsonpath_rw's Fields"""
+    try:
+        return [value[name]]
+    except (TypeError, KeyError, AttributeError):
+        return []
+
+
+def _index(value, index):
+    """The value at an index, as jsonpath_rw's Index"""
+    if len(value) > index:
+        return [value[index]]
+    return []
+
+
+def _wildcard(value, _):
+    """Every value of an array, as jsonpath_rw's Slice (which treats objects,
+    integers and strings as arrays of one value)
+    """
+    if isinstance(value, (dict, int, str)):
+        return [value]
+    return [value[idx] for idx in range(len(value))]
+
+
+class SimplePath(object):  # pylint: disable=too-few-public-methods
+    """A simple expression, evaluated by walking the document directly
+
+    Args:
+        steps (tuple): (function, argument) pairs, applied to each value in turn
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def values(self, data):
+        """Return the list of values matched in a document"""
+        values = [data]
+        for (func, arg) in self.steps:
+            matched = list()
+            for value in values:
+                matched.extend(func(value, arg))
+            values = matched
+        return values
+
+
+class ExtendedPath(object):  # pylint: disable=too-few-public-methods
+    """Any other expression, evaluated by jsonpath_rw_ext
+
+    Args:
+        expr: The parsed jsonpath_rw_ext expression
+    """
+
+    def __init__(self, expr):
+        self.expr = expr
+
+    def values(self, data):
+        """Return the list of values matched in a document"""
+        return [match.value for match in self.expr.find(data)]
+
+
+def _compile(expression):
+    """Compile an expression to a SimplePath if possible, otherwise an ExtendedPath"""
+    match = _SIMPLE.match(expression)
+    if match is not None:
+        steps = list()
+        for step in _STEPS.findall(match.group(1)):
+            if step in _RESERVED:
+                break
+            if step == "[*]":
+                steps.append((_wildcard, None))
+            elif step.startswith("["):
+                steps.append((_index, int(step[1:-1])))
+            else:
+                steps.append((_field, step[1:]))
+        else:
+            return SimplePath(tuple(steps))
+
+    import jsonpath_rw_ext
+    return ExtendedPath(jsonpath_rw_ext.parse(expression))
+
+
+def parse(expression):
+    """Return the compiled form of a jsonpath expression
+
+    Compiled expressions have a ``values(data)`` method, returning the list of
+    values matched in a decoded document.
+    """
+    path = _compiled.get(expression)
+    if path is None:
+        path = _compile(expression)
+        with _lock:
+            if len(_compiled) >= MAX_ENTRIES:
+                _compiled.clear()
+            _compiled[expression] = path
+    return path
+
+
+def reset():
+    """Discard all compiled expressions"""
+    with _lock:
+        _compiled.clear()
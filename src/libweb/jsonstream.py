@@ -0,0 +1,165 @@
+"""Incremental JSON Parsing
+
+This module implements the incremental parser used by JSON services with an
+``items`` setting, when their response bodies are streamed or spooled. Rather
+than decoding the whole document, the body is read in chunks, and each element
+of the array at the items path is decoded and returned as soon as it is
+complete:
+
+.. code:: python
+
+    >>> import io
+    >>> body = io.StringIO('{"total": 2, "data": [{"id": 1}, {"id": 2}]}')
+    >>> list(iter_items(body, "$.data[*]"))
+    [{'id': 1}, {'id': 2}]
+
+So at most one element is held in memory at a time (along with one chunk of the
+body), and the first element is available before the rest of the body has been
+received.
+
+Only paths made of field names, ending with a wildcard, are supported, such as
+``$[*]`` or ``$.data.events[*]``. Members of an object which precede the field
+on the path are decoded and discarded, and anything following the array is
+never read. If the value at the path is not an array, it is returned as the only
+element, as jsonpath_rw does.
+"""
+import json
+import re
+
+
+_PATH = re.compile(r"^\$((?:\.[A-Za-z_][A-Za-z0-9_]*)*)\[\*\]$")
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+def parse_path(expression):
+    """Return the list of field names leading to the array of an items path
+
+    Raises:
+        ValueError: If the path is not supported
+    """
+    match = _PATH.match(expression)
+    if match is None:
+        raise ValueError("Unsupported items path: {0}".format(expression))
+    return [field for field in match.group(1).split(".") if field]
+
+
+class _Reader(object):
+    """A buffer over a text file object, read as it is consumed"""
+
+    def __init__(self, fobj, chunk_size):
+        self.fobj = fobj
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size):
+        """Read at least size more characters, returning False at the end of the body"""
+        data = list()
+        while size > 0 and not self.eof:
+            chunk = self.fobj.read(max(size, self.chunk_size))
+            if not chunk:
+                self.eof = True
+            data.append(chunk)
+            size -= len(chunk)
+        if not data:
+            return False
+        self.buf = self.buf[self.pos:] + "".join(data)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace, and return the next character (without consuming it)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill(self.chunk_size):
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of chars"""
+        char = self.peek()
+        if char not in chars:
+            raise ValueError("Expecting one of {0!r} at {1!r}".format(
+                chars, self.buf[self.pos:self.pos + 20]))
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """Decode and consume the next value, reading more of the body until it
+        is complete
+        """
+        self.peek()
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                # Read at least as much again as is buffered, so that a value
+                # spanning many chunks is not decoded once per chunk
+                if not self.fill(len(self.buf) - self.pos):
+                    raise
+                continue
+            # A number may continue into the next chunk
+            if (not self.eof and _NUMBER_TAIL.match(self.buf, end).end() == len(self.buf)
+                    and self.fill(self.chunk_size)):
+                continue
+            self.pos = end
+            return value
+
+    def find_field(self, field):
+        """Consume the members of an object up to the value of field, returning
+        False (with the object consumed) if it has no such field
+        """
+        if self.peek() != "{":
+            self.decode()
+            return False
+        self.pos += 1
+        if self.peek() == "}":
+            self.pos += 1
+            return False
+        while True:
+            key = self.decode()
+            self.expect(":")
+            if key == field:
+                return True
+            self.decode()
+            if self.expect(",}") == "}":
+                return False
+
+
+def iter_items(fobj, path, chunk_size=64 * 1024):
+    """Iterate over the elements of the array at path in a JSON document
+
+    Args:
+        fobj (file): A text file object reading the document
+        path (str or list): An items path (see :func:`parse_path`), or the list
+            of field names it is made of
+
+    Kwargs:
+        chunk_size (int): The number of characters read at a time
+    """
+    if not isinstance(path, list):
+        path = parse_path(path)
+    reader = _Reader(fobj, chunk_size)
+    for field in path:
+        if not reader.find_field(field):
+            return
+
+    if reader.peek() != "[":
+        value = reader.decode()
+        if isinstance(value, (dict, int, str)):
+            value = [value]
+        for item in value:
+            yield item
+        return
+
+    reader.pos += 1
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.decode()
+        if reader.expect(",]") == "]":
+            return
@@ -0,0 +1,199 @@
+"""Metrics
+
+This module implements the instrumentation hooks used throughout libweb. Each
+service reports per-phase timings and counters to the recorder assigned to its
+``metrics`` attribute, which is ``None`` (disabled) by default:
+
+.. code:: python
+
+    from libweb import WebService
+    from libweb.metrics import HistogramMetrics
+
+    WebService.metrics = HistogramMetrics()
+    ...
+    print(WebService.metrics.render())
+
+The phases timed are ``throttle`` (waiting on a rate limit), ``network``
+(preparing and sending requests), ``backoff`` (waiting to retry a request),
+``decompress`` (decompressing response bodies), ``parse`` (decoding JSON,
+building XML trees, unescaping HTML), ``extract`` (applying jsonpath, xpath or
+regex expressions) and ``query`` (the whole iteration). The counters are
+``requests``, ``bytes`` (response bytes received), ``results``, ``cache_hits``
+and ``cache_misses`` (of the result cache), ``not_modified`` (results replayed
+from the HTTP cache), ``coalesced`` (requests which shared the response of an
+identical request) and ``batched`` (targets looked up by batched requests).
+"""
+import bisect
+import contextlib
+import threading
+from collections import defaultdict
+from timeit import default_timer
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metrics(object):
+    """Base metrics recorder, which discards everything. Override :meth:`timing`
+    and :meth:`count` to forward metrics elsewhere (statsd, logging, etc.)
+    """
+
+    def timing(self, service, phase, seconds):
+        """Record the time spent in a phase of a single request
+
+        Args:
+            service (WebService): The service being measured
+            phase (str): The name of the phase
+            seconds (float): The time spent in the phase
+        """
+        pass
+
+    def count(self, service, counter, value=1):
+        """Increment a counter
+
+        Args:
+            service (WebService): The service being measured
+            counter (str): The name of the counter
+            value (int): The amount to increment the counter by
+        """
+        pass
+
+
+class Histogram(object):
+    """A cumulative histogram with fixed bucket boundaries"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Add a single observation to the histogram"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def as_dict(self):
+        """Return the histogram as a dictionary of cumulative bucket counts"""
+        cumulative = 0
+        buckets = list()
+        for (bound, count) in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {"buckets": buckets, "sum": self.total, "count": self.count}
+
+
+class HistogramMetrics(Metrics):
+    """Keeps in-process histograms of phase timings and totals of counters,
+    keyed by service class name. Safe to share between threads.
+
+    Kwargs:
+        buckets (tuple): Histogram bucket boundaries, in seconds
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    @staticmethod
+    def _name(service):
+        return service.__class__.__name__
+
+    def reset(self):
+        """Discard all recorded metrics"""
+        with self.lock:
+            self.histograms = defaultdict(lambda: Histogram(self.buckets))
+            self.counters = defaultdict(int)
+
+    def timing(self, service, phase, seconds):
+        with self.lock:
+            self.histograms[(self._name(service), phase)].observe(seconds)
+
+    def count(self, service, counter, value=1):
+        with self.lock:
+            self.counters[(self._name(service), counter)] += value
+
+    def snapshot(self):
+        """Return a copy of the recorded metrics as plain dictionaries"""
+        with self.lock:
+            timings = defaultdict(dict)
+            for ((service, phase), histogram) in self.histograms.items():
+                timings[service][phase] = histogram.as_dict()
+            counters = defaultdict(dict)
+            for ((service, counter), value) in self.counters.items():
+                counters[service][counter] = value
+        return {"timings": dict(timings), "counters": dict(counters)}
+
+    def render(self):
+        """Render the recorded metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = ["# TYPE libweb_phase_seconds histogram"]
+        for (service, phases) in sorted(snapshot["timings"].items()):
+            for (phase, histogram) in sorted(phases.items()):
+                labels = 'service="{0}",phase="{1}"'.format(service, phase)
+                for (bound, count) in histogram["buckets"]:
+                    bound = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append('libweb_phase_seconds_bucket{{{0},le="{1}"}} {2}'.format(
+                        labels, bound, count))
+                lines.append("libweb_phase_seconds_sum{{{0}}} {1!r}".format(
+                    labels, histogram["sum"]))
+                lines.append("libweb_phase_seconds_count{{{0}}} {1}".format(
+                    labels, histogram["count"]))
+        lines.append("# TYPE libweb_total counter")
+        for (service, counters) in sorted(snapshot["counters"].items()):
+            for (counter, value) in sorted(counters.items()):
+                lines.append('libweb_total{{service="{0}",counter="{1}"}} {2}'.format(
+                    service, counter, value))
+        return "\n".join(lines) + "\n"
+
+
+def record(service, phase, seconds):
+    """Report a phase timing to the service's metrics recorder, if any"""
+    if service.metrics is not None:
+        service.metrics.timing(service, phase, seconds)
+
+
+def increment(service, counter, value=1):
+    """Report a counter increment to the service's metrics recorder, if any"""
+    if service.metrics is not None:
+        service.metrics.count(service, counter, value)
+
+
+@contextlib.contextmanager
+def timer(service, phase):
+    """Context manager which times the enclosed block as the given phase"""
+    start = default_timer()
+    try:
+        yield
+    finally:
+        record(service, phase, default_timer() - start)
+
+
+def timed_iter(service, phase, iterable):
+    """Yield from an iterable, timing only the work done producing each item
+
+    Time spent by the consumer between items is not counted. The total is
+    recorded once the iterable is exhausted (or closed).
+    """
+    if service.metrics is None:
+        for item in iterable:
+            yield item
+        return
+
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            start = default_timer()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += default_timer() - start
+                break
+            elapsed += default_timer() - start
+            yield item
+    finally:
+        record(service, phase, elapsed)
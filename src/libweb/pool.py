@@ -0,0 +1,73 @@
+"""Connection Pooling
+
+This module implements the process-wide registry of connection pools shared by
+HTTP services. Each service keeps its own requests Session (so cookies and
+other session state never leak between services), but mounts a shared
+transport adapter whose urllib3 pool manager keeps one pool of keep-alive
+connections per host and TLS configuration. Services built for different
+targets therefore reuse each other's TCP and TLS connections.
+
+Pools are configured with the ``pool`` setting of an HTTP service:
+
+.. code:: python
+
+    conf = {
+        "url": "https://www.virustotal.com/vtapi/v2/ip-address/report",
+        "pool": {"hosts": 10, "maxsize": 20, "block": True, "keep_alive": True},
+        ...
+    }
+
+Services using the same pool settings share the same pools.
+"""
+import threading
+
+
+class PoolRegistry(object):
+    """A thread-safe registry of shared requests transport adapters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.adapters = dict()
+
+    def get_adapter(self, hosts=10, maxsize=10, block=False):
+        """Return the shared adapter for a pool configuration
+
+        Kwargs:
+            hosts (int): The number of hosts (and TLS configurations) to keep pools for
+            maxsize (int): The maximum number of connections kept per host
+            block (bool): If True, wait for a free connection rather than opening
+                more than maxsize connections to a host
+        """
+        key = (hosts, maxsize, block)
+        with self.lock:
+            adapter = self.adapters.get(key)
+            if adapter is None:
+                from requests.adapters import HTTPAdapter
+                adapter = self.adapters[key] = HTTPAdapter(
+                    pool_connections=hosts, pool_maxsize=maxsize, pool_block=block)
+            return adapter
+
+    def mount(self, session, hosts=10, maxsize=10, block=False, keep_alive=True):
+        """Mount the shared adapter for a pool configuration on a session
+
+        Kwargs:
+            keep_alive (bool): If False, ask servers to close each connection
+                after a single request
+        """
+        adapter = self.get_adapter(hosts=hosts, maxsize=maxsize, block=block)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def close(self):
+        """Close every pooled connection and discard the adapters"""
+        with self.lock:
+            for adapter in self.adapters.values():
+                adapter.close()
+            self.adapters.clear()
+
+
+registry = PoolRegistry()
+"""The process-wide registry used by HTTP services by default"""
@@ -0,0 +1,78 @@
+"""Rate Limiting
+
+This module implements the token buckets used to pace HTTP requests. Buckets
+are shared by every service in the process, keyed by credential name or host,
+and are enabled with the ``rate_limit`` setting of an HTTP service:
+
+.. code:: python
+
+    conf = {
+        "url": "https://www.virustotal.com/vtapi/v2/ip-address/report",
+        "auth": {"name": "virustotal", "params": ["apikey"]},
+        "rate_limit": {"rate": 4, "per": 60},
+        ...
+    }
+
+Requests over the limit are delayed until a token is available, never failed.
+"""
+import threading
+import time
+
+from .registry import Registry
+
+
+class TokenBucket(object):
+    """A thread-safe token bucket
+
+    Args:
+        rate (float): The number of requests allowed per period
+
+    Kwargs:
+        per (float): The length of the period, in seconds
+        burst (int): The number of requests which may be sent back-to-back.
+            Defaults to 1, so requests are evenly spaced
+    """
+
+    def __init__(self, rate, per=1.0, burst=None):
+        self.rate = float(rate) / float(per)
+        self.capacity = float(burst or 1)
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, returning the number of seconds to wait before using it
+
+        Tokens may be borrowed from the future, so concurrent callers queue up
+        behind each other rather than all waking at once.
+        """
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """Take a token, blocking until it may be used"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+_limiters = Registry(TokenBucket)
+
+
+def get_limiter(key, rate, per=1.0, burst=None):
+    """Return the process-wide token bucket for key, creating it if necessary
+    (see :mod:`libweb.registry`)
+    """
+    return _limiters.get(key, rate, per=per, burst=burst)
+
+
+def reset():
+    """Discard all registered token buckets"""
+    _limiters.reset()
@@ -0,0 +1,114 @@
+"""Compact Results
+
+This module implements the compact record types yielded by services when their
+``compact_results`` attribute is True. A record is a tuple of values sharing a
+schema (its field names) with every other record of the same type, so it needs
+a fraction of the memory of a dict or OrderedDict, while still behaving like a
+read-only mapping:
+
+.. code:: python
+
+    >>> Point = record_type(("x", "y"))
+    >>> point = Point((1, 2))
+    >>> point["x"], "y" in point, list(point.items())
+    (1, True, [('x', 1), ('y', 2)])
+    >>> point.as_dict()
+    OrderedDict([('x', 1), ('y', 2)])
+
+Like a mapping, iterating over a record yields its field names. Fields which a
+service could not fill (e.g. a jsonpath which matched nothing) are None.
+"""
+import threading
+from collections import OrderedDict
+
+
+_types = dict()
+_types_lock = threading.Lock()
+
+
+def _rebuild(fields, values):
+    """Unpickle a record, recreating its type if necessary"""
+    return record_type(fields)(values)
+
+
+class Record(tuple):
+    """Base class for compact records. Use :func:`record_type` to create subclasses"""
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return tuple.__getitem__(self, key)
+        return tuple.__getitem__(self, self._index[key])
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self._fields == other._fields and self.values() == other.values()
+        if hasattr(other, "keys"):
+            return self.as_dict() == dict(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash((self._fields, self.values()))
+
+    def __reduce__(self):
+        return (_rebuild, (self._fields, self.values()))
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, ", ".join(
+            "{0}={1!r}".format(key, value) for (key, value) in self.items()))
+
+    def get(self, key, default=None):
+        """Return the value of a field, or default if there is no such field"""
+        idx = self._index.get(key)
+        if idx is None:
+            return default
+        return tuple.__getitem__(self, idx)
+
+    def keys(self):
+        """Return the field names"""
+        return self._fields
+
+    def values(self):
+        """Return the values, as a plain tuple"""
+        return tuple(tuple.__iter__(self))
+
+    def items(self):
+        """Return (field, value) pairs"""
+        return list(zip(self._fields, tuple.__iter__(self)))
+
+    def as_dict(self):
+        """Convert the record to an OrderedDict"""
+        return OrderedDict(zip(self._fields, tuple.__iter__(self)))
+
+
+def record_type(fields):
+    """Return the record type for a sequence of field names
+
+    Types are cached, so every call with the same fields returns the same class.
+    """
+    fields = tuple(fields)
+    cls = _types.get(fields)
+    if cls is None:
+        with _types_lock:
+            cls = _types.get(fields)
+            if cls is None:
+                cls = _types[fields] = type("Record", (Record,), {
+                    "__slots__": (),
+                    "_fields": fields,
+                    "_index": dict((field, idx) for (idx, field) in enumerate(fields)),
+                })
+    return cls
@@ -15,6 +15,8 @@ else:
 import re
 
 from .http import HttpService
+from .metrics import timed_iter, timer
+from .records import record_type
 
 
 class RegexService(HttpService):
@@ -22,28 +24,78 @@ class RegexService(HttpService):
 
     Keyword arguments:
         parse (list): Regular expressions used to parse data from the service
+
+    Regular expressions are applied to the whole body as a string, so a spooled
+    body is decoded into memory in full (and copied again when it is unescaped).
     """
 
     def get_html(self):
         """Make the HTTP request(s) and unescape the returned HTML"""
         for request in self.make_requests():
-            yield html_unescape(request.text)
+            with timer(self, "parse"):
+                body = html_unescape(self.read_text(request))
+            self.release_body(request)
+            yield body
+
+    def get_results(self):
+        """Make the HTTP requests and yield the results parsed from each response
+
+        If a subclass overrides :meth:`get_html`, the results are parsed from
+        the bodies it yields instead, bypassing the HTTP cache and batching.
+        """
+        if type(self).get_html is RegexService.get_html:
+            return super(RegexService, self).get_results()
+        return self._html_results()
+
+    def _html_results(self):
+        """Apply the configured regular expressions to each body from get_html"""
+        for body in self.get_html():
+            for result in timed_iter(self, "extract", self.parse_html(body)):
+                yield result
+
+    def build_plan(self):
+        """Compile the regular expressions provided in the configuration"""
+        plan = super(RegexService, self).build_plan()
+        plan["regexes"] = tuple(re.compile(regex) for regex in self.conf.get("parse", []))
+
+        fields = list()
+        for regex in plan["regexes"]:
+            for (name, _) in sorted(regex.groupindex.items(), key=lambda item: item[1]):
+                if name not in fields:
+                    fields.append(name)
+        plan["record"] = record_type(fields)
+        plan["fields"] = dict((name, idx) for (idx, name) in enumerate(fields))
+        return plan
 
     @property
     def regexes(self):
-        """Compile the regular expressions provided in the configuration"""
-        return [re.compile(regex) for regex in self.conf.get("parse", [])]
+        """The compiled regular expressions provided in the configuration"""
+        return self.plan["regexes"]
 
-    def get_results(self):
-        """Apply the configured regular expressions to the service's response"""
-        for body in self.get_html():
-            iters = [regex.finditer(body) for regex in self.regexes]
-            try:
-                zip_longest = itertools.zip_longest
-            except AttributeError:
-                # Python 2.7
-                zip_longest = itertools.izip_longest  # pylint: disable=no-member
-            for matches in zip_longest(*iters):
+    def parse_html(self, body):
+        """Apply the configured regular expressions to an unescaped response body"""
+        iters = [regex.finditer(body) for regex in self.regexes]
+        try:
+            zip_longest = itertools.zip_longest
+        except AttributeError:
+            # Python 2.7
+            zip_longest = itertools.izip_longest  # pylint: disable=no-member
+        (record, fields) = (self.plan["record"], self.plan["fields"])
+        for matches in zip_longest(*iters):
+            if self.compact_results:
+                values = [None] * len(fields)
+                for match in matches:
+                    if match is not None:
+                        for (name, value) in match.groupdict().items():
+                            values[fields[name]] = value
+                yield record(values)
+            else:
                 yield dict(itertools.chain.from_iterable(
                     [m.groupdict().items() for m in matches if m is not None]
                 ))
+
+    def parse_response(self, request):
+        """Apply the configured regular expressions to a single response"""
+        with timer(self, "parse"):
+            body = html_unescape(self.read_text(request))
+        return timed_iter(self, "extract", self.parse_html(body))
@@ -0,0 +1,45 @@
+"""Shared Registries
+
+This module implements the process-wide registries through which services share
+rate limiters, circuit breakers and batchers. A registry creates an object the
+first time its key is requested, and returns the same object for that key from
+then on:
+
+.. code:: python
+
+    >>> from libweb.ratelimit import TokenBucket
+    >>> limiters = Registry(TokenBucket)
+    >>> limiters.get("api.example.com", 10) is limiters.get("api.example.com", 20)
+    True
+
+So the first configuration registered for a key is used by every service
+sharing that key.
+"""
+import threading
+
+
+class Registry(object):
+    """A thread-safe mapping of keys to shared objects
+
+    Args:
+        factory (callable): Creates the object for a key, from the arguments
+            given to :meth:`get`
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.entries = dict()
+
+    def get(self, key, *args, **kwargs):
+        """Return the object for key, creating it from args and kwargs if necessary"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = self.factory(*args, **kwargs)
+            return entry
+
+    def reset(self):
+        """Discard every registered object"""
+        with self.lock:
+            self.entries.clear()
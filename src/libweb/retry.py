@@ -0,0 +1,158 @@
+"""Retries and Circuit Breaking
+
+This module implements the retry policy and circuit breakers used by HTTP
+services. Both are disabled by default, and are enabled with the ``retry`` and
+``circuit_breaker`` settings of an HTTP service:
+
+.. code:: python
+
+    conf = {
+        "url": "https://www.virustotal.com/vtapi/v2/ip-address/report",
+        "retry": {"attempts": 4, "backoff": 0.5, "max_backoff": 30},
+        "circuit_breaker": {"threshold": 5, "reset": 60},
+        ...
+    }
+
+Failed requests are retried after a jittered, exponentially growing delay. When
+a 429 or 503 response carries a Retry-After header, that delay is used instead
+(up to max_backoff). Only requests with idempotent methods are retried, except
+for 429 and 503 responses with a Retry-After header, which the server has
+explicitly asked to be retried.
+
+Circuit breakers are shared by every service in the process, keyed by host.
+Once ``threshold`` consecutive requests to a host have failed (with a
+connection error, a timeout or a 5xx response), further requests fail
+immediately with :class:`CircuitOpenError` for ``reset`` seconds. Then a single
+trial request is let through, which closes the circuit again if it succeeds.
+"""
+import calendar
+import email.utils
+import random
+import threading
+import time
+
+from .registry import Registry
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a host which is failing"""
+
+
+class RetryPolicy(object):  # pylint: disable=too-few-public-methods
+    """Decides whether, and after how long, a failed request is retried
+
+    Kwargs:
+        attempts (int): The maximum number of attempts, including the first
+        backoff (float): The base delay, in seconds, which doubles after each attempt
+        max_backoff (float): The longest delay, in seconds, including any Retry-After
+        status_codes (list): Response status codes which are retried
+        methods (list): Methods which are retried. Other requests are only retried
+            after a 429 or 503 response with a Retry-After header
+    """
+
+    def __init__(self, attempts=3, backoff=0.5, max_backoff=30.0,
+                 status_codes=(429, 500, 502, 503, 504),
+                 methods=("GET", "HEAD", "OPTIONS", "PUT", "DELETE")):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.status_codes = frozenset(int(sc) for sc in status_codes)
+        self.methods = frozenset(method.upper() for method in methods)
+
+    def delay(self, attempt, method, response=None):
+        """Return the number of seconds to wait before retrying, or None to give up
+
+        Args:
+            attempt (int): The number of attempts made so far, less one
+            method (str): The request method
+            response (requests.Response): The response received, or None if the
+                request failed with a connection error or timeout
+        """
+        if attempt + 1 >= self.attempts:
+            return None
+        if response is not None:
+            if response.status_code not in self.status_codes:
+                return None
+            if response.status_code in (429, 503):
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    return min(retry_after, self.max_backoff)
+        if method.upper() not in self.methods:
+            return None
+
+        # "Full jitter", so that clients failing together do not retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))  # nosec
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds, or an HTTP date) to seconds, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    if parsed[9] is None:
+        parsed = parsed[:9] + (0,)
+    return max(0.0, email.utils.mktime_tz(parsed) - calendar.timegm(time.gmtime()))
+
+
+class CircuitBreaker(object):
+    """A thread-safe circuit breaker
+
+    Kwargs:
+        threshold (int): The number of consecutive failures which open the circuit
+        reset_after (float): The number of seconds the circuit stays open before
+            a trial request is let through
+    """
+
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpenError if a request may not be sent now"""
+        with self.lock:
+            if self.opened is None:
+                return
+            if self.trial or time.time() - self.opened < self.reset_after:
+                raise CircuitOpenError("Circuit open after {0} consecutive failures".format(
+                    self.failures))
+            self.trial = True
+
+    def success(self):
+        """Record a successful request, closing the circuit"""
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def failure(self):
+        """Record a failed request, opening the circuit if there have been too many"""
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened = time.time()
+                self.trial = False
+
+
+_breakers = Registry(CircuitBreaker)
+
+
+def get_breaker(key, threshold=5, reset_after=30.0):
+    """Return the process-wide circuit breaker for key, creating it if necessary
+    (see :mod:`libweb.registry`)
+    """
+    return _breakers.get(key, threshold=threshold, reset_after=reset_after)
+
+
+def reset():
+    """Discard all registered circuit breakers"""
+    _breakers.reset()
@@ -0,0 +1,73 @@
+"""Request Coalescing
+
+This module implements the single-flight groups used to coalesce identical,
+concurrent requests. While a request is in flight, any identical request made
+by another thread waits for it and shares its response (or its exception),
+rather than being sent upstream again. Nothing is kept once the request has
+completed, so unlike a cache, responses are never stale.
+
+Coalescing is enabled by assigning a group to the ``single_flight`` attribute
+of a service class:
+
+.. code:: python
+
+    from libweb import WebService
+    from libweb.singleflight import SingleFlight
+
+    WebService.single_flight = SingleFlight()
+
+HTTP requests are identical if their method, URL (including parameters), body
+and headers (including credentials) are the same. Streamed HTTP requests are
+never coalesced. DNS queries are identical if their name, type and
+nameservers are the same.
+"""
+import sys
+import threading
+
+
+class _Call(object):  # pylint: disable=too-few-public-methods
+    """A call in flight, and its outcome once complete"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """A thread-safe group of in-flight calls, keyed by request"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = dict()
+
+    def do(self, key, func):
+        """Call func, unless a call with the same key is in flight, and return
+        a (result, shared) pair
+
+        shared is False for the caller which actually called func, and True for
+        those which waited for it. Exceptions raised by func are raised to every
+        waiting caller.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                raise call.exc_info[1]
+            return (call.result, True)
+
+        try:
+            call.result = func()
+        except BaseException:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return (call.result, False)
@@ -0,0 +1,102 @@
+"""Streamed Bodies
+
+This module implements the helpers used to hand streamed response bodies to
+parsers. Responses are streamed when the ``stream`` setting of an HTTP service
+is True, in which case the body is read from the connection in chunks as the
+parser consumes it, rather than being loaded into memory before parsing.
+
+Streaming saves holding the raw body alongside its parsed form, but it does not
+by itself bound memory. XML services still build the whole tree, and JSON
+services still decode the whole document, which json.load reads as a single
+string. Only JSON services with an ``items`` setting, or with ``multi_json``,
+parse a streamed body piece by piece. JSON services with ``multi_json`` always
+stream their responses.
+
+Bodies spooled to disk (see the ``spool`` setting of an HTTP service) are
+memory-mapped, and read through :func:`open_buffer` without being copied onto
+the heap.
+"""
+import io
+
+
+class ChunkReader(io.RawIOBase):
+    """A read-only, unseekable file object over an iterator of byte chunks
+
+    Args:
+        chunks (iterable): The byte strings making up the body
+    """
+
+    def __init__(self, chunks):
+        super(ChunkReader, self).__init__()
+        self.chunks = iter(chunks)
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b""
+                return 0
+        size = min(len(buf), len(self.pending))
+        buf[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        close = getattr(self.chunks, "close", None)
+        if callable(close):
+            close()
+        super(ChunkReader, self).close()
+
+
+def open_chunks(chunks, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    """Return a buffered file object reading from an iterator of byte chunks"""
+    return io.BufferedReader(ChunkReader(chunks), buffer_size=buffer_size)
+
+
+class BufferReader(io.RawIOBase):
+    """A read-only, seekable file object over a buffer, such as an mmap
+
+    Args:
+        buf: The bytes-like object to read
+    """
+
+    def __init__(self, buf):
+        super(BufferReader, self).__init__()
+        self.view = memoryview(buf)
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buf):
+        size = min(len(buf), len(self.view) - self.offset)
+        buf[:size] = self.view[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.offset
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.offset = max(0, offset)
+        return self.offset
+
+    def tell(self):
+        return self.offset
+
+    def close(self):
+        self.view.release()
+        super(BufferReader, self).close()
+
+
+def open_buffer(buf, buffer_size=io.DEFAULT_BUFFER_SIZE):
+    """Return a buffered file object reading from a bytes-like object"""
+    return io.BufferedReader(BufferReader(buf), buffer_size=buffer_size)
@@ -0,0 +1,105 @@
+"""Relative Time Parameters
+
+This module resolves the relative time expressions which HTTP services accept
+as parameter values:
+
+.. code:: python
+
+    conf = {
+        "url": "https://api.example.com/events",
+        "params": {
+            "since": {"relatime": "-24h@h", "timezone": "UTC", "format": "as_epoch"},
+        },
+    }
+
+Resolving an expression means parsing it, and looking up the local and target
+timezones, which is too slow to repeat for every request of a bulk run. So the
+local and target timezones are only looked up once. With a time bucket, each
+expression is also resolved at most once per bucket, as of the start of that
+bucket, so times are rounded down to the bucket size. Bucketing is disabled by
+default, so that times are exact.
+"""
+import datetime
+import threading
+import time
+
+
+DEFAULT_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+MAX_ENTRIES = 1024
+
+_resolved = dict()
+_timezones = dict()
+_lock = threading.Lock()
+
+
+def local_timezone():
+    """Return the name of the local timezone"""
+    name = _timezones.get(None)
+    if name is None:
+        from tzlocal import get_localzone
+
+        name = _timezones[None] = str(get_localzone())
+    return name
+
+
+def get_timezone(name):
+    """Return the pytz timezone with the given name"""
+    tzinfo = _timezones.get(name)
+    if tzinfo is None:
+        import pytz
+
+        tzinfo = _timezones[name] = pytz.timezone(name)
+    return tzinfo
+
+
+def resolve(expression, timezone="UTC", time_format=DEFAULT_FORMAT, bucket=None):
+    """Resolve a relatime expression to a formatted time
+
+    Args:
+        expression (str): A relatime expression, such as "-1d@d"
+
+    Kwargs:
+        timezone (str): The timezone of the resulting time
+        time_format (str): A strftime format, or "as_epoch" for a Unix timestamp
+        bucket (float): The number of seconds for which a resolved expression
+            is reused. If None or 0, expressions are resolved every time
+    """
+    now = time.time()
+    if not bucket:
+        return _resolve(expression, timezone, time_format, now)
+    now -= now % bucket
+    key = (expression, timezone, time_format, now)
+
+    value = _resolved.get(key)
+    if value is None:
+        value = _resolve(expression, timezone, time_format, now)
+        with _lock:
+            if len(_resolved) >= MAX_ENTRIES:
+                _resolved.clear()
+            _resolved[key] = value
+    return value
+
+
+def _resolve(expression, timezone, time_format, now):
+    """Resolve a relatime expression as of the timestamp now"""
+    import relatime
+
+    dto = relatime.timeParser(expression, timezone=local_timezone(),
+                              now=lambda: datetime.datetime.fromtimestamp(now))
+    dto = dto.astimezone(get_timezone(timezone))
+    dto = dto.replace(tzinfo=None)
+    if time_format.lower() == "as_epoch":
+        try:
+            timestamp = dto.timestamp()
+        except AttributeError:
+            import calendar
+            timestamp = calendar.timegm(dto.timetuple())
+        return str(int(timestamp))
+    return dto.strftime(time_format)
+
+
+def reset():
+    """Discard resolved expressions and timezones, e.g. after the local timezone changes"""
+    with _lock:
+        _resolved.clear()
+        _timezones.clear()
@@ -0,0 +1,160 @@
+"""Transports
+
+This module implements the transports which HTTP services use to prepare and
+send requests. A transport is assigned to a service's ``transport`` attribute,
+and is shared by every instance of the service class:
+
+.. code:: python
+
+    from libweb.http import HttpService
+    from libweb.transport import Urllib3Transport
+
+    HttpService.transport = Urllib3Transport(maxsize=20)
+
+:class:`RequestsTransport` (the default) sends requests with a requests
+Session, through :meth:`libweb.http.HttpService.build_request`,
+:meth:`~libweb.http.HttpService.prepare_request` and
+:meth:`~libweb.http.HttpService.send_request`. :class:`Urllib3Transport`
+sends them straight to a urllib3 connection pool. It skips the session's
+cookie handling, environment lookups and hook dispatch, which for small
+responses can cost more than parsing them.
+
+Either way, parameters and authentication are processed by the service first
+(``process_*`` and ``get_auth``). Responses are returned as
+``requests.Response`` objects and then decompressed by ``unzip_content``.
+"""
+import threading
+import warnings
+
+
+class Transport(object):
+    """Base transport. Subclasses must implement :meth:`prepare` and :meth:`send`"""
+
+    def prepare(self, service, url, kwargs):
+        """Build a prepared request
+
+        Args:
+            service (HttpService): The service making the request
+            url (str): The URL to request
+            kwargs (dict): The method, headers, params, data and auth of the request
+        """
+        raise NotImplementedError
+
+    def send(self, service, request, verify_ssl=True, stream=False):
+        """Send a prepared request, returning a requests.Response
+
+        If stream is True, only the response headers are read before returning.
+        """
+        raise NotImplementedError
+
+
+class RequestsTransport(Transport):
+    """Sends requests with the service's requests Session"""
+
+    def prepare(self, service, url, kwargs):
+        return service.prepare_request(service.build_request(url, **kwargs))
+
+    def send(self, service, request, verify_ssl=True, stream=False):
+        return service.send_request(request, verify_ssl=verify_ssl, stream=stream)
+
+
+class Urllib3Transport(Transport):
+    """Sends requests straight to a urllib3 connection pool
+
+    Redirects are followed, but cookies are not kept between requests, and the
+    build_request, prepare_request and send_request methods of the service are
+    not used.
+
+    Kwargs:
+        hosts (int): The number of hosts to keep connection pools for
+        maxsize (int): The maximum number of connections kept per host
+        block (bool): If True, wait for a free connection rather than opening
+            more than maxsize connections to a host
+        timeout (float): Connect and read timeout, in seconds
+        max_redirects (int): The maximum number of redirects to follow
+    """
+
+    def __init__(self, hosts=10, maxsize=10, block=False, timeout=None, max_redirects=30):
+        self.options = {"num_pools": hosts, "maxsize": maxsize, "block": block}
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.managers = dict()
+        self.lock = threading.Lock()
+
+    def get_manager(self, verify_ssl=True):
+        """Return the pool manager for verified or unverified connections"""
+        manager = self.managers.get(verify_ssl)
+        if manager is None:
+            with self.lock:
+                manager = self.managers.get(verify_ssl)
+                if manager is None:
+                    import urllib3
+
+                    options = dict(self.options)
+                    if not verify_ssl:
+                        options["cert_reqs"] = "CERT_NONE"
+                    manager = self.managers[verify_ssl] = urllib3.PoolManager(**options)
+        return manager
+
+    def prepare(self, service, url, kwargs):
+        from requests.models import PreparedRequest
+
+        headers = {
+            "User-Agent": service.user_agent,
+            "Accept-Encoding": "gzip, deflate",
+            "Accept": "*/*",
+        }
+        headers.update(kwargs.get("headers") or {})
+
+        request = PreparedRequest()
+        request.prepare(method=kwargs.get("method", "GET"), url=url, headers=headers,
+                        data=kwargs.get("data"), params=kwargs.get("params"),
+                        json=kwargs.get("json"), auth=kwargs.get("auth"))
+        return request
+
+    def send(self, service, request, verify_ssl=True, stream=False):
+        import requests
+        import requests.utils
+        import urllib3
+        from requests.structures import CaseInsensitiveDict
+
+        retries = urllib3.Retry(total=None, connect=0, read=0, status=0,
+                                redirect=self.max_redirects, raise_on_redirect=False)
+        with warnings.catch_warnings():
+            if not verify_ssl:
+                warnings.simplefilter("ignore", urllib3.exceptions.InsecureRequestWarning)
+            try:
+                raw = self.get_manager(verify_ssl).urlopen(
+                    request.method, request.url, body=request.body,
+                    headers=dict(request.headers), retries=retries,
+                    timeout=urllib3.Timeout(self.timeout), preload_content=False,
+                    decode_content=False)
+            except urllib3.exceptions.HTTPError as exc:
+                raise _convert_error(exc, request)
+
+        response = requests.Response()
+        response.status_code = raw.status
+        response.reason = raw.reason
+        response.headers = CaseInsensitiveDict(raw.headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.raw = raw
+        response.url = getattr(raw, "url", None) or request.url
+        response.request = request
+        if not stream:
+            response.content  # pylint: disable=pointless-statement
+        return response
+
+
+def _convert_error(exc, request):
+    """Convert a urllib3 exception to the requests exception a Session would raise"""
+    import requests.exceptions
+    import urllib3.exceptions
+
+    reason = getattr(exc, "reason", None) or exc
+    if isinstance(reason, urllib3.exceptions.SSLError):
+        return requests.exceptions.SSLError(exc, request=request)
+    if isinstance(reason, urllib3.exceptions.ConnectTimeoutError):
+        return requests.exceptions.ConnectTimeout(exc, request=request)
+    if isinstance(reason, urllib3.exceptions.TimeoutError):
+        return requests.exceptions.ReadTimeout(exc, request=request)
+    return requests.exceptions.ConnectionError(exc, request=request)
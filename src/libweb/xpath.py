@@ -2,14 +2,54 @@
 
 This module implements services using XML formatted HTTP responses
 """
+import collections
+import json
 import warnings
 from io import BytesIO
+from timeit import default_timer
 
-import html5lib
-from defusedxml.lxml import parse
-from lxml import etree
-
+from . import metrics
 from .http import HttpService
+from .metrics import increment, timed_iter, timer
+from .records import record_type
+
+
+_parsers = dict()
+
+
+def parse_content(cls, conf, settings, content):
+    """Parse a response body and apply the configured xpath expressions
+
+    This runs in the worker processes of :attr:`XpathService.parse_executor`, so
+    one service per class, configuration and settings is kept in each worker,
+    to avoid recompiling its expressions for every response.
+
+    Args:
+        cls (type): The XpathService (sub)class whose parser should be used
+        conf (dict): The service configuration
+        settings (dict): Attributes to set on the service, from
+            :meth:`XpathService.parse_settings`
+        content (bytes): The response body
+
+    Returns:
+        A (results, timings) pair, where timings holds the seconds spent in the
+        parse and extract phases
+    """
+    key = (cls, json.dumps([conf, settings], sort_keys=True, default=repr))
+    service = _parsers.get(key)
+    if service is None:
+        if len(_parsers) >= 128:
+            _parsers.clear()
+        service = cls(**conf)
+        for (name, value) in settings.items():
+            setattr(service, name, value)
+        _parsers[key] = service
+
+    start = default_timer()
+    tree = service.build_tree(content)
+    parsed = default_timer()
+    results = list(service.parse_tree(tree))
+    return (results, {"parse": parsed - start, "extract": default_timer() - parsed})
 
 
 class XpathService(HttpService):
@@ -18,27 +58,131 @@ class XpathService(HttpService):
     Keyword arguments:
         xpath (dict): key/value matches for extracting data
     """
+    parse_executor = None
+    """
+    A concurrent.futures.Executor, usually a ProcessPoolExecutor, used to parse
+    responses and apply the xpath expressions. Responses are still fetched by
+    the calling thread, and results are yielded in order. When None, parsing
+    happens inline
+    """
+    parse_backlog = None
+    """
+    The maximum number of responses submitted to the parse_executor whose
+    results have not yet been yielded. Defaults to the executor's number of
+    workers
+    """
+
+    def build_plan(self):
+        """Compile the configured xpath expressions"""
+        from lxml import etree
+
+        plan = super(XpathService, self).build_plan()
+        plan["xpaths"] = list()
+        for (key, xpath) in self.conf.get("xpath", {}).items():
+            if xpath.startswith("/"):
+                xpath = ".{0}".format(xpath)
+            plan["xpaths"].append((key, etree.XPath(xpath), record_type((key,))))
+        plan["xpaths"] = tuple(plan["xpaths"])
+        return plan
+
     def build_tree(self, content):  # pylint: disable=no-self-use
-        """Uses defusedxml to parse the response into ElementTree"""
-        return parse(BytesIO(content))
+        """Uses defusedxml to parse the response into ElementTree
+
+        content may be bytes, or a file object (when streaming or spooling)
+        """
+        from defusedxml.lxml import parse
+
+        if isinstance(content, bytes):
+            content = BytesIO(content)
+        return parse(content)
+
+    def parse_response(self, request):
+        """Parse a single response and yield a structured message per matched node"""
+        with timer(self, "parse"):
+            if (getattr(request, "streaming", False)
+                    or getattr(request, "body_map", None) is not None):
+                with self.open_body(request) as body:
+                    tree = self.build_tree(body)
+            else:
+                tree = self.build_tree(self.read_body(request))
+        return timed_iter(self, "extract", self.parse_tree(tree))
 
     def get_results(self):
-        """Make the HTTP requests and yield a structured message"""
+        """Make the HTTP requests and yield a structured message per matched node"""
+        if self.parse_executor is None:
+            return super(XpathService, self).get_results()
+        return self._offloaded_results()
+
+    def parse_settings(self):
+        """Return the attributes which the parse_executor's copies of this
+        service must share with it
+
+        Workers build their own copy of the service from its configuration, so
+        override this if other instance state affects parsing.
+        """
+        return {"compact_results": self.compact_results}
+
+    def _offloaded_results(self):
+        """Fetch responses while earlier ones are parsed by the parse_executor
+
+        No more than :attr:`parse_backlog` responses are held at once, so the
+        bodies of responses waiting to be parsed are not all kept in memory.
+        """
+        from concurrent import futures
+
+        backlog = self.parse_backlog
+        if backlog is None:
+            backlog = getattr(self.parse_executor, "_max_workers", None) or 1
+        settings = self.parse_settings()
+        pending = collections.deque()
         for request in self.make_requests():
-            tree = self.build_tree(request.content)
-            if "xpath" in self.conf:
-                for (key, xpath) in self.conf["xpath"].items():
-                    if xpath.startswith("/"):
-                        xpath = ".{0}".format(xpath)
-                    for node in tree.xpath(xpath):
-                        if getattr(node, "is_attribute", False):
-                            value = str(node).strip()
-                        elif getattr(node, "is_text", False):
-                            value = str(node).strip()
-                        elif isinstance(node, etree._Element):  # pylint: disable=protected-access
-                            value = " ".join(node.itertext()).strip()
-
-                        yield {key: value}
+            cached = getattr(request, "cached_results", None)
+            if cached is not None:
+                increment(self, "not_modified")
+                future = futures.Future()
+                future.set_result((cached, None))
+            else:
+                content = self.read_body(request)
+                self.release_body(request)
+                future = self.parse_executor.submit(
+                    parse_content, self.__class__, self.conf, settings, content)
+            pending.append((request, future))
+            while pending and (len(pending) >= backlog or pending[0][1].done()):
+                for result in self._offloaded(*pending.popleft()):
+                    yield result
+        while pending:
+            for result in self._offloaded(*pending.popleft()):
+                yield result
+
+    def _offloaded(self, request, future):
+        """Collect the results parsed by the parse_executor, recording the time
+        it spent, and caching the results if possible
+        """
+        (results, timings) = future.result()
+        if timings is not None:
+            for (phase, seconds) in timings.items():
+                metrics.record(self, phase, seconds)
+        if getattr(request, "cached_results", None) is None:
+            self._store_results(request, results)
+        return results
+
+    def parse_tree(self, tree):
+        """Apply the configured xpath expressions to a parsed tree"""
+        from lxml import etree
+
+        for (key, xpath, record) in self.plan["xpaths"]:
+            for node in xpath(tree):
+                if getattr(node, "is_attribute", False):
+                    value = str(node).strip()
+                elif getattr(node, "is_text", False):
+                    value = str(node).strip()
+                elif isinstance(node, etree._Element):  # pylint: disable=protected-access
+                    value = " ".join(node.itertext()).strip()
+
+                if self.compact_results:
+                    yield record((value,))
+                else:
+                    yield {key: value}
 
 
 class HtmlXpathService(XpathService):
@@ -48,6 +192,8 @@ class HtmlXpathService(XpathService):
     """
     def build_tree(self, content):
         """Use the html5lib parser to parse HTML"""
+        import html5lib
+
         with warnings.catch_warnings():
             # Some sites use xmlns, like "fb", in ways that lxml doesn't like
             warnings.simplefilter("ignore")
@@ -14,6 +14,10 @@ conf = {
         "name": "virustotal",
         "params": ["apikey"]
     },
+    "rate_limit": {
+        "rate": 4,
+        "per": 60
+    },
     "jsonpath": {
         "url": "$.detected_urls[*].url",
         "pdns": "$.resolutions[*]",
@@ -0,0 +1,22 @@
+import threading
+
+
+def run_concurrently(func, args):
+    """Call func with each of args in a separate thread, returning the list of
+    results (in the order of args) and the list of exceptions raised
+    """
+    results = [None] * len(args)
+    errors = list()
+
+    def target(idx):
+        try:
+            results[idx] = func(args[idx])
+        except Exception as exc:  # pylint: disable=broad-except
+            errors.append(exc)
+
+    threads = [threading.Thread(target=target, args=(idx,)) for idx in range(len(args))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (results, errors)
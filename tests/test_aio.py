@@ -0,0 +1,197 @@
+import logging
+import sys
+import threading
+try:
+    from unittest import mock, skipIf, TestCase
+except ImportError:
+    from unittest import skipIf, TestCase
+    from mock import mock
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import fauxfactory
+import httpbin.core
+from wsgi_intercept import add_wsgi_intercept, requests_intercept
+
+from libweb import WebService
+from libweb.dns import DnsService
+from libweb.json import JsonService
+from libweb.xpath import XpathService
+
+try:
+    import asyncio
+except ImportError:  # pragma nocover
+    asyncio = None
+
+try:
+    import aiohttp
+except ImportError:  # pragma nocover
+    aiohttp = None
+
+
+def collect(aiterable):
+    """Drain an async iterable on a fresh event loop"""
+    loop = asyncio.new_event_loop()
+    iterator = aiterable.__aiter__()
+    results = list()
+    try:
+        while True:
+            try:
+                results.append(loop.run_until_complete(iterator.__anext__()))
+            except StopAsyncIteration:
+                break
+    finally:
+        from libweb import aio
+
+        loop.run_until_complete(aio.close_session())
+        loop.close()
+    return results
+
+
+class ThreadedJsonService(JsonService):
+    async_transport = "thread"
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@skipIf(sys.version_info < (3, 6), "asyncio support requires Python 3.6")
+class TestAio(TestCase):
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("httpbin.org", 80, lambda: httpbin.core.app)
+
+        logging.getLogger("requests").setLevel("ERROR")
+        self.fake_target = fauxfactory.gen_ipaddr()
+        self.service = ThreadedJsonService(self.fake_target)
+        self.service.swallow_exceptions = False
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def test_aiter_swallows_exceptions(self):
+        service = WebService()
+        with self.assertLogs():
+            self.assertEqual(collect(service), [])
+
+    def test_aiter_swallow_exceptions_false(self):
+        service = WebService()
+        service.swallow_exceptions = False
+        with self.assertLogs():
+            with self.assertRaises(NotImplementedError):
+                collect(service)
+
+    def test_aiter_matches_iter(self):
+        result_key = fauxfactory.gen_alpha().lower()
+        conf = {
+            "url": "http://httpbin.org/get",
+            "jsonpath": {result_key: "$.headers.Host"}
+        }
+
+        self.service.conf = dict(conf)
+        expected = list(self.service)
+        self.service.conf = dict(conf)
+        self.assertEqual(collect(self.service), expected)
+
+    def test_aiter_threaded_fallback(self):
+        class SyncOnly(WebService):
+            def get_results(self):
+                for value in range(3):
+                    yield {"value": value}
+
+        self.assertEqual(collect(SyncOnly()), [{"value": 0}, {"value": 1}, {"value": 2}])
+
+    def test_amake_requests_ignored_status_code(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/status/404",
+            "ignored_status_codes": [404]
+        }
+        self.assertEqual(collect(self.service), [])
+
+    def test_aiter_pagination(self):
+        pages = iter(range(1, 10))
+        self.service.conf = {
+            "url": "http://httpbin.org/get",
+            "jsonpath": {"page": "$.args.page"},
+            "paginate": {"header": "X-Next", "max_pages": 3},
+        }
+        self.service.next_page = lambda response, paginate: "/get?page={0}".format(next(pages))
+        self.assertEqual(collect(self.service), [{}, {"page": "1"}, {"page": "2"}])
+
+    def test_adns_resolve_override(self):
+        import dns.rrset
+
+        class StaticDnsService(DnsService):
+            def resolve(self, resolver, rrname, rrtype):
+                return dns.rrset.from_text(rrname, 300, "IN", rrtype, "10.0.0.1")
+
+        service = StaticDnsService(rrname="example.com.", rrtype="A")
+        service.swallow_exceptions = False
+        self.assertEqual([result["rdata"] for result in collect(service)], ["10.0.0.1"])
+
+
+@skipIf(aiohttp is None, "aiohttp is not installed")
+class TestAioHttp(TestCase):
+    def setUp(self):
+        self.server = make_server("127.0.0.1", 0, httpbin.core.app, handler_class=QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base_url = "http://127.0.0.1:{0}".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_aiohttp_json(self):
+        service = JsonService(**{
+            "url": self.base_url + "/get",
+            "params": {"target": "{target}"},
+            "jsonpath": {"target": "$.args.target"},
+        })
+        service.opts = {"target": "example.com"}
+        service.swallow_exceptions = False
+        self.assertEqual(collect(service), [{"target": "example.com"}])
+
+    def test_aiohttp_session_shared(self):
+        from libweb import aio
+
+        services = [JsonService(url=self.base_url + "/get", jsonpath={"host": "$.url"})
+                    for _ in range(2)]
+
+        async def run():
+            sessions = list()
+            for service in services:
+                service.swallow_exceptions = False
+                self.assertEqual(len([result async for result in service]), 1)
+                sessions.append(aio.get_session())
+            return sessions
+
+        loop = asyncio.new_event_loop()
+        try:
+            (first, second) = loop.run_until_complete(run())
+            self.assertIs(first, second)
+            self.assertFalse(first.closed)
+            loop.run_until_complete(aio.close_session())
+            self.assertTrue(first.closed)
+        finally:
+            loop.close()
+
+    def test_aiohttp_single_flight(self):
+        from libweb.singleflight import SingleFlight
+
+        service = JsonService(url=self.base_url + "/get", jsonpath={"host": "$.url"})
+        service.swallow_exceptions = False
+        service.single_flight = SingleFlight()
+        with mock.patch.object(service, "_send", wraps=service._send) as send:
+            self.assertEqual(len(collect(service)), 1)
+        self.assertEqual(send.call_count, 1)
+
+    def test_aiohttp_xpath(self):
+        service = XpathService(**{
+            "url": self.base_url + "/xml",
+            "xpath": {"title": '//slide[@type="all"][1]/title/text()'},
+        })
+        service.swallow_exceptions = False
+        self.assertEqual(collect(service), [{"title": "Wake up to WonderWidgets!"}])
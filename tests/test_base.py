@@ -42,3 +42,75 @@ class TestHttp(TestCase):
 
         self.assertIn(test_key, self.service.opts)
         self.assertEqual(self.service.opts[test_key], test_value)
+
+
+class EchoService(WebService):
+    def get_results(self):
+        yield {"target": self.opts["target"], "conf": self.conf.get("value")}
+
+
+class TestMap(TestCase):
+    def test_map_tags_results(self):
+        service = EchoService(value="x")
+        targets = [{"target": fauxfactory.gen_alpha()} for _ in range(10)]
+
+        results = list(service.map(targets, concurrency=3))
+        self.assertEqual(len(results), len(targets))
+        for (opts, result) in results:
+            self.assertEqual(opts["target"], result["target"])
+            self.assertEqual(result["conf"], "x")
+        self.assertEqual(
+            sorted(opts["target"] for (opts, _) in results),
+            sorted(opts["target"] for opts in targets)
+        )
+
+    def test_map_bounds_concurrency(self):
+        import threading
+        import time
+
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+
+        class SlowService(WebService):
+            def get_results(self):
+                with lock:
+                    state["running"] += 1
+                    state["peak"] = max(state["peak"], state["running"])
+                time.sleep(0.01)
+                with lock:
+                    state["running"] -= 1
+                yield self.opts
+
+        targets = ({"target": str(i)} for i in range(20))
+        self.assertEqual(len(list(SlowService().map(targets, concurrency=4))), 20)
+        self.assertLessEqual(state["peak"], 4)
+
+    def test_map_does_not_modify_service(self):
+        service = EchoService(opts={"target": "original"}, value="x")
+        list(service.map([{"target": "other"}]))
+        self.assertEqual(service.opts, {"target": "original"})
+
+
+class TestPlan(TestCase):
+    def test_plan_built_once(self):
+        class PlannedService(WebService):
+            builds = 0
+
+            def build_plan(self):
+                PlannedService.builds += 1
+                return {"value": self.conf["value"]}
+
+        service = PlannedService(value="x")
+        for target in ("a", "b", "c"):
+            self.assertEqual(service.bind({"target": target}).plan, {"value": "x"})
+        self.assertEqual(PlannedService.builds, 1)
+
+        service.conf = {"value": "y"}
+        self.assertEqual(service.plan, {"value": "y"})
+        self.assertEqual(PlannedService.builds, 2)
+
+    def test_bind_copies_opts(self):
+        service = EchoService(opts={"target": "original"}, value="x")
+        bound = service.bind({"target": "other"})
+        self.assertEqual(list(bound), [{"target": "other", "conf": "x"}])
+        self.assertEqual(service.opts, {"target": "original"})
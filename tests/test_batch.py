@@ -0,0 +1,147 @@
+import json
+import time
+from unittest import TestCase
+try:
+    from urllib.parse import parse_qs
+except ImportError:  # pragma nocover
+    from urlparse import parse_qs
+
+from helpers import run_concurrently
+from wsgi_intercept import add_wsgi_intercept, requests_intercept
+
+from libweb import batch
+from libweb.json import JsonService
+from libweb.metrics import HistogramMetrics
+
+
+class TestBatcher(TestCase):
+    def setUp(self):
+        self.calls = list()
+
+    def func(self, values):
+        self.calls.append(values)
+        return dict((value, [value.upper()]) for value in values)
+
+    def test_full_batches(self):
+        batcher = batch.Batcher(size=3, wait=5)
+        start = time.time()
+        (results, _) = run_concurrently(lambda value: batcher.submit(value, self.func),
+                                        list("abcdef"))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(results, [[value] for value in "ABCDEF"])
+        self.assertEqual(sorted(len(values) for values in self.calls), [3, 3])
+
+    def test_wait_expires(self):
+        batcher = batch.Batcher(size=10, wait=0.1)
+        (results, _) = run_concurrently(lambda value: batcher.submit(value, self.func), list("ab"))
+        self.assertEqual(results, [["A"], ["B"]])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(batcher.submit("c", self.func), ["C"])
+        self.assertEqual(self.calls[-1], ["c"])
+
+    def test_exceptions_shared(self):
+        def func(values):
+            raise ValueError(values)
+
+        batcher = batch.Batcher(size=3, wait=1)
+        (_, errors) = run_concurrently(lambda value: batcher.submit(value, func), list("abc"))
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(exc, ValueError) for exc in errors))
+
+    def test_demultiplex(self):
+        results = [{"ip": "a", "n": 1}, {"ip": "b", "n": 2}, {"ip": "a", "n": 3},
+                   {"ip": "z", "n": 4}]
+        self.assertEqual(batch.demultiplex(["a", "b", "c"], results, "ip"), {
+            "a": [{"ip": "a", "n": 1}, {"ip": "a", "n": 3}],
+            "b": [{"ip": "b", "n": 2}],
+            "c": [],
+        })
+
+    def test_registry(self):
+        batch.reset()
+        self.assertIs(batch.get_batcher("key", size=5), batch.get_batcher("key", size=10))
+        self.assertEqual(batch.get_batcher("key").size, 5)
+
+
+class TestBatchedServices(TestCase):
+    def get_app(self):
+        def app(environ, start_response):
+            if environ["REQUEST_METHOD"] == "POST":
+                length = int(environ.get("CONTENT_LENGTH") or 0)
+                ips = json.loads(environ["wsgi.input"].read(length).decode("utf-8"))
+            else:
+                ips = parse_qs(environ.get("QUERY_STRING", ""))["ips"][0].split(",")
+            self.hits.append(ips)
+            self.users.append(environ.get("HTTP_AUTHORIZATION"))
+            body = {"results": [{"ip": ip, "score": len(ip)} for ip in ips if ip != "unknown"]}
+            start_response("200 OK", [("Content-Type", "application/json")])
+            return [json.dumps(body).encode("utf-8")]
+        return app
+
+    def setUp(self):
+        batch.reset()
+        requests_intercept.install()
+        add_wsgi_intercept("bulk.test", 80, self.get_app)
+        self.hits = list()
+        self.users = list()
+        self.service = JsonService(url="http://bulk.test/lookup?ips={ip}",
+                                   batch={"option": "ip", "key": "ip", "size": 3,
+                                          "items": "$.results[*]"},
+                                   jsonpath={"ip": "$.ip", "score": "$.score"})
+        self.service.swallow_exceptions = False
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def test_map(self):
+        self.service.metrics = HistogramMetrics()
+        targets = [{"ip": ip} for ip in ("1.1.1.1", "10.0.0.1", "unknown", "8.8.8.8")]
+        results = dict((opts["ip"], result) for (opts, result) in self.service.map(targets))
+        self.assertEqual(results, {"1.1.1.1": {"ip": "1.1.1.1", "score": 7},
+                                   "10.0.0.1": {"ip": "10.0.0.1", "score": 8},
+                                   "8.8.8.8": {"ip": "8.8.8.8", "score": 7}})
+        self.assertEqual(sorted(len(ips) for ips in self.hits), [1, 3])
+
+        counters = self.service.metrics.snapshot()["counters"]["JsonService"]
+        self.assertEqual(counters["requests"], 2)
+        self.assertEqual(counters["batched"], 4)
+
+    def test_map_compact_results(self):
+        self.service.compact_results = True
+        results = list(self.service.map([{"ip": "1.1.1.1"}]))
+        self.assertEqual(results, [({"ip": "1.1.1.1"}, {"ip": "1.1.1.1", "score": 7})])
+
+    def test_map_groups_other_options(self):
+        self.service.conf = dict(self.service.conf, url="http://bulk.test/{path}?ips={ip}")
+        targets = [{"ip": "a", "path": "x"}, {"ip": "b", "path": "y"}, {"ip": "c", "path": "x"}]
+        self.assertEqual(len(list(self.service.map(targets))), 3)
+        self.assertEqual(sorted(self.hits), [["a", "c"], ["b"]])
+
+    def test_concurrent_bound_services(self):
+        ips = ["1.1.1.1", "2.2.2.2", "3.3.3.3"]
+        (results, _) = run_concurrently(lambda ip: list(self.service.bind({"ip": ip})), ips)
+        self.assertEqual(results, [[{"ip": ip, "score": 7}] for ip in ips])
+        self.assertEqual(len(self.hits), 1)
+
+    def test_concurrent_services_with_other_creds(self):
+        services = list()
+        for user in ("alice", "bob"):
+            service = JsonService(creds={"basic": [user, "secret"]},
+                                  auth="basic", **self.service.conf)
+            service.swallow_exceptions = False
+            services.extend((service, service))
+        ips = ["1.1.1.1", "2.2.2.2", "3.3.3.3", "4.4.4.4"]
+        (results, _) = run_concurrently(lambda idx: list(services[idx].bind({"ip": ips[idx]})),
+                                        list(range(len(ips))))
+        self.assertEqual(results, [[{"ip": ip, "score": 7}] for ip in ips])
+        self.assertEqual(sorted(sorted(hit) for hit in self.hits),
+                         [["1.1.1.1", "2.2.2.2"], ["3.3.3.3", "4.4.4.4"]])
+        self.assertEqual(len(set(self.users)), 2)
+
+    def test_json_body(self):
+        self.service.conf = dict(self.service.conf, url="http://bulk.test/lookup",
+                                 method="post", batch=dict(self.service.conf["batch"],
+                                                           json=True))
+        results = list(self.service.map([{"ip": "1.1.1.1"}, {"ip": "10.0.0.1"}]))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(self.hits, [["1.1.1.1", "10.0.0.1"]])
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import fauxfactory
+
+from libweb import WebService
+from libweb.cache import cache_key, MemoryCache, SqliteCache, TieredCache
+
+
+class CountingService(WebService):
+    calls = 0
+
+    def get_results(self):
+        CountingService.calls += 1
+        yield {"target": self.opts.get("target")}
+        yield {"value": self.conf.get("value")}
+
+
+class TestCacheKey(TestCase):
+    def test_key_is_stable(self):
+        first = CountingService(opts={"target": "a"}, value=1, other=2)
+        second = CountingService(opts={"target": "a"}, other=2, value=1)
+        self.assertEqual(cache_key(first), cache_key(second))
+
+    def test_key_depends_on_opts_conf_and_class(self):
+        base = CountingService(opts={"target": "a"}, value=1)
+        self.assertNotEqual(cache_key(base), cache_key(CountingService(opts={"target": "b"},
+                                                                       value=1)))
+        self.assertNotEqual(cache_key(base), cache_key(CountingService(opts={"target": "a"},
+                                                                       value=2)))
+        self.assertNotEqual(cache_key(base), cache_key(WebService(opts={"target": "a"},
+                                                                  value=1)))
+
+    def test_key_depends_on_creds(self):
+        alice = CountingService(creds={"api": ["alice"]}, opts={"target": "a"})
+        bob = CountingService(creds={"api": ["bob"]}, opts={"target": "a"})
+        self.assertNotEqual(cache_key(alice), cache_key(bob))
+        self.assertEqual(cache_key(alice), cache_key(
+            CountingService(creds={"api": ["alice"]}, opts={"target": "a"})))
+
+
+class TestMemoryCache(TestCase):
+    def test_lru_eviction(self):
+        cache = MemoryCache(maxsize=2)
+        cache.set("a", [1])
+        cache.set("b", [2])
+        cache.get("a")
+        cache.set("c", [3])
+
+        self.assertEqual(cache.get("a"), [1])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), [3])
+
+    def test_ttl_expiry(self):
+        cache = MemoryCache(ttl=-1)
+        cache.set("a", [1])
+        self.assertIsNone(cache.get("a"))
+
+
+class TestSqliteCache(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_shared_between_instances(self):
+        key = fauxfactory.gen_alpha()
+        SqliteCache(self.path).set(key, [{"a": 1}])
+        self.assertEqual(SqliteCache(self.path).get(key), [{"a": 1}])
+
+    def test_ttl_expiry(self):
+        cache = SqliteCache(self.path, ttl=-1)
+        cache.set("a", [1])
+        self.assertIsNone(cache.get("a"))
+        cache.purge()
+
+    def test_tiered_backfill(self):
+        memory = MemoryCache()
+        sqlite = SqliteCache(self.path)
+        cache = TieredCache(memory, sqlite)
+
+        sqlite.set("a", [1])
+        self.assertEqual(cache.get("a"), [1])
+        self.assertEqual(memory.get("a"), [1])
+
+
+class TestServiceCache(TestCase):
+    def setUp(self):
+        CountingService.calls = 0
+
+    def test_repeat_query_is_cached(self):
+        cache = MemoryCache()
+        for _ in range(3):
+            service = CountingService(opts={"target": "a"}, value=1)
+            service.cache = cache
+            self.assertEqual(list(service), [{"target": "a"}, {"value": 1}])
+        self.assertEqual(CountingService.calls, 1)
+
+    def test_compact_results_cached_separately(self):
+        cache = MemoryCache()
+        service = CountingService(opts={"target": "a"})
+        service.cache = cache
+        compact = CountingService(opts={"target": "a"})
+        compact.compact_results = True
+        compact.cache = cache
+        self.assertNotEqual(cache_key(service), cache_key(compact))
+        list(service)
+        list(compact)
+        self.assertEqual(CountingService.calls, 2)
+
+    def test_partial_iteration_not_cached(self):
+        cache = MemoryCache()
+        service = CountingService(opts={"target": "a"})
+        service.cache = cache
+        for _ in service:
+            break
+        self.assertEqual(len(list(service)), 2)
+        self.assertEqual(CountingService.calls, 2)
+
+    def test_expired_results_refetched(self):
+        cache = MemoryCache(ttl=0.01)
+        service = CountingService(opts={"target": "a"})
+        service.cache = cache
+        list(service)
+        time.sleep(0.02)
+        list(service)
+        self.assertEqual(CountingService.calls, 2)
@@ -0,0 +1,73 @@
+import bz2
+import gzip
+import io
+import lzma
+import zipfile
+from unittest import TestCase
+
+from libweb.compression import decompress, sniff
+
+
+def chunked(data, size=7):
+    return [data[idx:idx + size] for idx in range(0, len(data), size)]
+
+
+class TestCompression(TestCase):
+    data = b"".join(b"line %d of the feed\n" % idx for idx in range(1000))
+
+    def assert_roundtrip(self, compressed, expected=None):
+        expected = self.data if expected is None else expected
+        self.assertEqual(b"".join(decompress([compressed])), expected)
+        self.assertEqual(b"".join(decompress(chunked(compressed))), expected)
+
+    def test_sniff(self):
+        self.assertEqual(sniff(gzip.compress(b"x")), "gzip")
+        self.assertEqual(sniff(bz2.compress(b"x")), "bzip2")
+        self.assertEqual(sniff(b"PK\x03\x04"), "zip")
+        self.assertIsNone(sniff(b"plain"))
+
+    def test_plain(self):
+        self.assert_roundtrip(self.data)
+        self.assert_roundtrip(b"abc", b"abc")
+        self.assertEqual(list(decompress([])), [])
+
+    def test_gzip(self):
+        self.assert_roundtrip(gzip.compress(self.data))
+
+    def test_gzip_multiple_members(self):
+        half = len(self.data) // 2
+        compressed = gzip.compress(self.data[:half]) + gzip.compress(self.data[half:])
+        self.assert_roundtrip(compressed + b"\0" * 8)
+
+    def test_bzip2(self):
+        self.assert_roundtrip(bz2.compress(self.data))
+        self.assert_roundtrip(bz2.compress(self.data) * 2, self.data * 2)
+
+    def test_xz(self):
+        import lzma
+        self.assert_roundtrip(lzma.compress(self.data))
+
+    def test_zip_members(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zfo:
+            zfo.writestr("a.txt", b"first\n")
+            zfo.writestr("dir/", b"")
+            zfo.writestr("dir/b.txt", self.data)
+        self.assert_roundtrip(buf.getvalue(), b"first\n" + self.data)
+
+    def test_output_bounded(self):
+        bomb = gzip.compress(b"\0" * (10 * 1024 * 1024))
+        chunks = decompress([bomb], chunk_size=4096)
+        self.assertEqual(len(next(chunks)), 4096)
+        self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks))
+
+        for compress in (bz2.compress, lzma.compress):
+            chunks = list(decompress([compress(self.data)], chunk_size=1000))
+            self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+            self.assertEqual(b"".join(chunks), self.data)
+
+    def test_truncated(self):
+        for compress in (gzip.compress, bz2.compress, lzma.compress):
+            truncated = compress(self.data)[:-20]
+            with self.assertRaises(EOFError):
+                b"".join(decompress(chunked(truncated)))
@@ -210,6 +210,31 @@ class TestHttp(TestCase):
         self.assertIn(header_key, data)
         self.assertEqual(data[header_key], apikey)
 
+    def test_auth_per_target(self):
+        class TargetAuthService(HttpService):
+            def get_auth(self, auth):
+                return {"headers": {"X-Target": self.opts["target"]}}
+
+        service = TargetAuthService(url="http://httpbin.org/headers")
+        for target in ("a", "b"):
+            r = next(service.bind({"target": target}).make_requests())
+            self.assertEqual(r.json()["headers"]["X-Target"], target)
+
+    def test_auth_planned(self):
+        service = HttpService(url="http://httpbin.org/headers", auth="basic",
+                              creds={"basic": ["user", "pass"]})
+        self.assertEqual(service.plan["auth"], {"auth": ("user", "pass")})
+
+        class PlannedAuthService(HttpService):
+            plan_auth = True
+
+            def get_auth(self, auth):
+                return {"headers": {"X-Target": self.opts["target"]}}
+
+        service = PlannedAuthService(url="http://httpbin.org/headers", opts={"target": "a"})
+        r = next(service.bind({"target": "b"}).make_requests())
+        self.assertEqual(r.json()["headers"]["X-Target"], "a")
+
     def test_param_auth(self):
         param_key = fauxfactory.gen_alpha()
         authname = fauxfactory.gen_alpha()
@@ -261,3 +286,85 @@ class TestHttp(TestCase):
             "ignored_status_codes": [status_code]
         }
         [self.assertEqual(status_code, _.status_code) for _ in self.service.make_requests()]
+
+    def test_stream_body(self):
+        self.service.chunk_size = 100
+        r = self.do_request("http://httpbin.org/bytes/1000?seed=1", stream=True)
+        self.assertTrue(r.streaming)
+
+        chunks = list(self.service.iter_body(r))
+        self.assertFalse(r.streaming)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+
+        expected = self.do_request("http://httpbin.org/bytes/1000?seed=1").content
+        self.assertEqual(b"".join(chunks), expected)
+
+    def test_stream_error_released(self):
+        import requests
+
+        self.service.conf = {"url": "http://httpbin.org/status/500", "stream": True}
+        with mock.patch.object(requests.models.Response, "close", autospec=True) as close:
+            with self.assertRaises(requests.HTTPError):
+                list(self.service.make_requests())
+        self.assertTrue(close.called)
+
+    def test_stream_open_body(self):
+        r = self.do_request("http://httpbin.org/get", stream=True)
+        with self.service.open_body(r) as body:
+            self.assertIn(b'"url"', body.read())
+
+        r = self.do_request("http://httpbin.org/get")
+        self.assertFalse(getattr(r, "streaming", False))
+        self.assertEqual(self.service.read_body(r), r.content)
+
+
+class TestHttpDecompress(TestCase):
+    data = b"".join(b"record %d\n" % idx for idx in range(1000))
+
+    def get_app(self):
+        import gzip
+
+        def app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "application/octet-stream")])
+            return [gzip.compress(self.data)]
+        return app
+
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("feeds.test", 80, self.get_app)
+        self.service = HttpService(fauxfactory.gen_ipaddr())
+        self.service.chunk_size = 256
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def test_decompress(self):
+        r = self.service._req("http://feeds.test/", decompress=True)
+        self.assertEqual(r.orig_content, self.data)
+        self.assertEqual(self.service.read_body(r), self.data)
+
+    def test_stream_decompress(self):
+        r = self.service._req("http://feeds.test/", decompress=True, stream=True)
+        chunks = list(self.service.iter_body(r))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), self.data)
+
+    def test_spool_small_body(self):
+        r = self.service._req("http://feeds.test/", decompress=True, spool=len(self.data))
+        self.assertIsNone(getattr(r, "body_map", None))
+        self.assertEqual(r.orig_content, self.data)
+
+    def test_spool_large_body(self):
+        import mmap
+
+        r = self.service._req("http://feeds.test/", decompress=True, spool=1000)
+        self.assertIsInstance(r.body_map, mmap.mmap)
+        self.assertFalse(hasattr(r, "orig_content"))
+        self.assertEqual(self.service.read_body(r), self.data)
+        self.assertEqual(self.service.read_text(r), self.data.decode())
+        self.assertEqual(b"".join(self.service.iter_body(r)), self.data)
+        with self.service.open_body(r) as body:
+            self.assertEqual(body.readline(), b"record 0\n")
+            body.seek(-4, 2)
+            self.assertEqual(body.read(), b"999\n")
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+
+HEAVY_MODULES = [
+    "requests",
+    "magic",
+    "pytz",
+    "relatime",
+    "tzlocal",
+    "jsonpath_rw_ext",
+    "ply",
+    "lxml",
+    "html5lib",
+    "defusedxml",
+    "sqlite3",
+    "concurrent.futures",
+]
+
+SCRIPT = """
+import json, sys, time
+start = time.time()
+from {module} import {name}
+duration = time.time() - start
+print(json.dumps({{
+    "duration": duration,
+    "loaded": sorted(m for m in {heavy!r} if m in sys.modules),
+}}))
+"""
+
+
+class TestImports(TestCase):
+    budget = 0.5
+    """Generous upper bound, in seconds, for importing a service module"""
+
+    def do_import(self, module, name):
+        src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([src, env.get("PYTHONPATH", "")])
+        script = SCRIPT.format(module=module, name=name, heavy=HEAVY_MODULES)
+        output = subprocess.check_output([sys.executable, "-c", script], env=env)
+        return json.loads(output.decode("utf-8"))
+
+    def assert_lightweight(self, module, name):
+        result = self.do_import(module, name)
+        self.assertEqual(result["loaded"], [])
+        self.assertLess(result["duration"], self.budget)
+
+    def test_import_json(self):
+        self.assert_lightweight("libweb.json", "JsonService")
+
+    def test_import_xpath(self):
+        self.assert_lightweight("libweb.xpath", "XpathService")
+
+    def test_import_regex(self):
+        self.assert_lightweight("libweb.regex", "RegexService")
+
+    def test_import_http(self):
+        self.assert_lightweight("libweb.http", "HttpService")
@@ -1,5 +1,10 @@
 import logging
-from unittest import TestCase
+import time
+try:
+    from unittest import mock, TestCase
+except ImportError:
+    from unittest import TestCase
+    from mock import mock
 
 import fauxfactory
 import httpbin.core
@@ -95,3 +100,444 @@ class TestJson(TestCase):
         self.assertEqual(data[result_key_1], "httpbin.org")
         self.assertIn(result_key_2, data)
         self.assertEqual(data[result_key_2], "http://httpbin.org/get")
+
+    def test_map_targets(self):
+        targets = [{"target": fauxfactory.gen_alpha().lower()} for _ in range(5)]
+        self.service.conf = {
+            "url": "http://httpbin.org/get",
+            "params": {"target": "{target}"},
+            "jsonpath": {"target": "$.args.target"}
+        }
+
+        results = list(self.service.map(targets, concurrency=2))
+        self.assertEqual(len(results), len(targets))
+        for (opts, result) in results:
+            self.assertEqual(result["target"], opts["target"])
+
+    def test_service_is_reusable(self):
+        conf = {
+            "url": "http://httpbin.org/get",
+            "params": {"target": "{target}"},
+            "headers": {"X-Target": "{target}"},
+            "jsonpath": {"target": "$.args.target", "header": "$.headers.X-Target"}
+        }
+        self.service.conf = conf
+        for _ in range(2):
+            for target in ("a", "b"):
+                results = list(self.service.bind({"target": target}))
+                self.assertEqual(results, [{"target": target, "header": target}])
+        self.assertEqual(conf["url"], "http://httpbin.org/get")
+        self.assertEqual(conf["params"], {"target": "{target}"})
+
+    def test_compact_results(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/get",
+            "jsonpath": {"host": "$.headers.Host", "missing": "$.nothing"}
+        }
+        self.service.compact_results = True
+
+        results = list(self.service)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["host"], "httpbin.org")
+        self.assertIsNone(results[0]["missing"])
+        self.assertEqual(results[0].as_dict(), {"host": "httpbin.org", "missing": None})
+
+    def test_stream(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/get",
+            "jsonpath": {"host": "$.headers.Host"},
+            "stream": True,
+        }
+        self.assertEqual(list(self.service), [{"host": "httpbin.org"}])
+
+    def test_stream_multi_json(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/stream/5",
+            "multi_json": True,
+            "stream": True,
+        }
+        results = list(self.service)
+        self.assertEqual([result["id"] for result in results], list(range(5)))
+
+    def test_get_data_override(self):
+        class StaticService(JsonService):
+            def get_data(self):
+                yield {"ip": "10.0.0.1"}
+                yield {"ip": "10.0.0.2"}
+
+        service = StaticService(jsonpath={"ip": "$.ip"})
+        self.assertEqual(list(service), [{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}])
+
+    def test_stream_ignored_status_released(self):
+        import requests
+
+        self.service.conf = {
+            "url": "http://httpbin.org/status/404",
+            "ignored_status_codes": [404],
+            "stream": True,
+        }
+        with mock.patch.object(requests.models.Response, "close", autospec=True) as close:
+            self.assertEqual(list(self.service), [])
+        self.assertTrue(close.called)
+
+    def test_stream_multi_json_lazy(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/stream/50",
+            "multi_json": True,
+            "stream": True,
+        }
+        self.service.chunk_size = 256
+        response = next(self.service.make_requests())
+        documents = self.service.decode_response(response)
+        self.assertEqual(next(documents)["id"], 0)
+        self.assertLess(response.raw.tell(), 2048)
+        self.assertEqual([data["id"] for data in documents], list(range(1, 50)))
+
+    def test_multi_json_streamed(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/stream/50",
+            "multi_json": True,
+        }
+        response = next(self.service.make_requests())
+        self.assertTrue(response.streaming)
+        documents = self.service.decode_response(response)
+        self.assertEqual(next(documents)["id"], 0)
+        self.assertEqual([data["id"] for data in documents], list(range(1, 50)))
+
+    def test_multi_json_jsonpath_per_line(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/stream/3",
+            "multi_json": True,
+            "jsonpath": {"id": "$.id"},
+        }
+        self.assertEqual(list(self.service), [{"id": 0}, {"id": 1}, {"id": 2}])
+
+    def test_multi_json_items(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/stream/2",
+            "multi_json": True,
+            "items": "$.headers",
+            "jsonpath": {"host": "$.Host"},
+        }
+        self.assertEqual(list(self.service), [{"host": "httpbin.org"}] * 2)
+
+    def test_spool(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/get",
+            "jsonpath": {"host": "$.headers.Host"},
+            "spool": 10,
+        }
+        self.assertEqual(list(self.service), [{"host": "httpbin.org"}])
+
+
+class TestJsonConditional(TestCase):
+    def get_app(self):
+        def app(environ, start_response):
+            self.requests.append(environ)
+            if environ.get("HTTP_IF_NONE_MATCH") == '"v1"' or \
+                    environ.get("HTTP_IF_MODIFIED_SINCE") == self.last_modified:
+                start_response("304 Not Modified", [("ETag", '"v1"')])
+                return [b""]
+            start_response("200 OK", [("Content-Type", "application/json"),
+                                      ("ETag", '"v1"'),
+                                      ("Last-Modified", self.last_modified)])
+            return [b'{"items": [{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}]}']
+        return app
+
+    def setUp(self):
+        from libweb.cache import MemoryCache
+
+        requests_intercept.install()
+        add_wsgi_intercept("feeds.test", 80, self.get_app)
+        self.requests = list()
+        self.last_modified = "Sat, 17 Oct 2026 12:00:00 GMT"
+        self.service = JsonService(url="http://feeds.test/", jsonpath={"ip": "$.items[*].ip"})
+        self.service.swallow_exceptions = False
+        self.service.http_cache = MemoryCache()
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def test_not_modified_replays_results(self):
+        expected = [{"ip": ["10.0.0.1", "10.0.0.2"]}]
+        self.assertEqual(list(self.service), expected)
+        self.assertNotIn("HTTP_IF_NONE_MATCH", self.requests[0])
+
+        parsed = list()
+        self.service.parse_response = lambda response: parsed.append(response)
+        self.assertEqual(list(self.service), expected)
+        self.assertEqual(self.requests[1]["HTTP_IF_NONE_MATCH"], '"v1"')
+        self.assertEqual(self.requests[1]["HTTP_IF_MODIFIED_SINCE"], self.last_modified)
+        self.assertEqual(parsed, [])
+
+    def test_disabled(self):
+        self.service.http_cache = None
+        list(self.service)
+        list(self.service)
+        self.assertNotIn("HTTP_IF_NONE_MATCH", self.requests[1])
+
+    def test_not_modified_streams_released(self):
+        from libweb.pool import PoolRegistry
+
+        registry = PoolRegistry()
+        self.addCleanup(registry.close)
+        self.service.pool_registry = registry
+        self.service.conf = dict(self.service.conf, pool={"maxsize": 1, "block": True},
+                                 multi_json=True, jsonpath={"ip": "$.ip"})
+        pools = registry.get_adapter(maxsize=1, block=True).poolmanager.pools
+        list(self.service)
+        for _ in range(3):
+            # A leaked connection would block the next request forever
+            list(self.service)
+            self.assertEqual([pools[key].pool.qsize() for key in pools.keys()], [1])
+        self.assertEqual(self.requests[-1]["HTTP_IF_NONE_MATCH"], '"v1"')
+
+    def test_changed_conf_not_replayed(self):
+        list(self.service)
+        self.service.conf = {"url": "http://feeds.test/", "jsonpath": {"first": "$.items[0].ip"}}
+        self.assertEqual(list(self.service), [{"first": "10.0.0.1"}])
+        self.assertNotIn("HTTP_IF_NONE_MATCH", self.requests[1])
+
+
+class TestJsonPagination(TestCase):
+    items = ["10.0.0.{0}".format(idx) for idx in range(7)]
+
+    def get_app(self):
+        from wsgiref.util import request_uri
+        try:
+            from urllib.parse import parse_qs, urlparse
+        except ImportError:  # pragma nocover
+            from urlparse import parse_qs, urlparse
+        import json
+
+        def app(environ, start_response):
+            url = urlparse(request_uri(environ))
+            params = dict((key, values[0]) for (key, values) in parse_qs(url.query).items())
+            self.requests.append(params)
+            start = int(params.get("cursor", 0))
+            limit = int(params.get("limit", 3))
+            end = start + limit
+            body = {"items": [{"ip": ip} for ip in self.items[start:end]]}
+            headers = [("Content-Type", "application/json")]
+            if end < len(self.items):
+                body["cursor"] = end
+                body["next"] = "/items?cursor={0}&limit={1}".format(end, limit)
+                headers.append(("Link", "<http://api.test/items?cursor={0}&limit={1}>; "
+                                        'rel="next"'.format(end, limit)))
+            start_response("200 OK", headers)
+            return [json.dumps(body).encode("utf-8")]
+        return app
+
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("api.test", 80, self.get_app)
+        self.requests = list()
+        self.service = JsonService()
+        self.service.swallow_exceptions = False
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def paginate(self, **paginate):
+        self.service.conf = {
+            "url": "http://api.test/items",
+            "jsonpath": {"ip": "$.items[*].ip"},
+            "paginate": paginate,
+        }
+        results = list()
+        for result in self.service:
+            ips = result.get("ip", [])
+            results.extend(ips if isinstance(ips, list) else [ips])
+        return results
+
+    def test_cursor(self):
+        results = self.paginate(next="$.cursor", cursor_param="cursor",
+                                page_size_param="limit", page_size=2)
+        self.assertEqual(results, self.items)
+        self.assertEqual([r.get("cursor") for r in self.requests], [None, "2", "4", "6"])
+        self.assertTrue(all(r["limit"] == "2" for r in self.requests))
+
+    def test_next_url(self):
+        self.assertEqual(self.paginate(next="$.next"), self.items)
+        self.assertEqual(len(self.requests), 3)
+
+    def test_link_header(self):
+        self.assertEqual(self.paginate(header="Link", prefetch=False), self.items)
+        self.assertEqual(len(self.requests), 3)
+
+    def test_max_pages(self):
+        self.assertEqual(self.paginate(next="$.next", max_pages=2), self.items[:6])
+        self.assertEqual(len(self.requests), 2)
+
+    def test_prefetch(self):
+        self.service.conf = {
+            "url": "http://api.test/items",
+            "jsonpath": {"ip": "$.items[*].ip"},
+            "paginate": {"next": "$.next"},
+        }
+        requests = self.service.make_requests()
+        next(requests)
+        future_requests = None
+        for _ in range(100):
+            future_requests = len(self.requests)
+            if future_requests == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(future_requests, 2)
+        requests.close()
+
+    def test_prefetched_page_closed_early(self):
+        from requests import Response
+
+        self.service.conf = {
+            "url": "http://api.test/items",
+            "jsonpath": {"ip": "$.items[*].ip"},
+            "paginate": {"next": "$.next"},
+            "stream": True,
+        }
+        pages = self.service.make_requests()
+        first = next(pages)
+        with mock.patch.object(Response, "close", autospec=True) as close:
+            pages.close()
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(close.call_count, 1)
+        self.assertIsNot(close.call_args[0][0], first)
+
+    def test_page_size_param_without_page_size(self):
+        results = self.paginate(next="$.next", page_size_param="limit")
+        self.assertEqual(results, self.items)
+        self.assertNotIn("limit", self.requests[0])
+
+
+class TestJsonParallel(TestCase):
+    def get_app(self):
+        import json
+
+        def app(environ, start_response):
+            delay = float(environ["PATH_INFO"].strip("/"))
+            time.sleep(delay)
+            start_response("200 OK", [("Content-Type", "application/json")])
+            return [json.dumps({"delay": delay}).encode("utf-8")]
+        return app
+
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("slow.test", 80, self.get_app)
+        self.service = JsonService(url=["http://slow.test/0.3", "http://slow.test/0.2",
+                                        "http://slow.test/0.0"],
+                                   jsonpath={"delay": "$.delay"})
+        self.service.swallow_exceptions = False
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def delays(self):
+        start = time.time()
+        results = [result["delay"] for result in self.service]
+        return (results, time.time() - start)
+
+    def test_sequential_by_default(self):
+        (results, elapsed) = self.delays()
+        self.assertEqual(results, [0.3, 0.2, 0.0])
+        self.assertGreaterEqual(elapsed, 0.5)
+
+    def test_original_order(self):
+        self.service.conf = dict(self.service.conf, parallel={"workers": 3})
+        (results, elapsed) = self.delays()
+        self.assertEqual(results, [0.3, 0.2, 0.0])
+        self.assertLess(elapsed, 0.45)
+
+    def test_completion_order(self):
+        self.service.conf = dict(self.service.conf, parallel={"workers": 3,
+                                                              "order": "completion"})
+        (results, elapsed) = self.delays()
+        self.assertEqual(results, [0.0, 0.2, 0.3])
+        self.assertLess(elapsed, 0.45)
+
+    def test_completion_order_close(self):
+        self.service.conf = dict(self.service.conf, url=["http://slow.test/0.0",
+                                                         "http://slow.test/0.3",
+                                                         "http://slow.test/0.3"],
+                                 parallel={"workers": 1, "order": "completion"})
+        requests = self.service.make_requests()
+        next(requests)
+        start = time.time()
+        requests.close()
+        self.assertLess(time.time() - start, 0.2)
+
+    def test_running_urls_closed_early(self):
+        from requests import Response
+
+        self.service.conf = dict(self.service.conf, url=["http://slow.test/0.0",
+                                                         "http://slow.test/0.2"],
+                                 parallel={"workers": 2}, stream=True)
+        requests = self.service.make_requests()
+        next(requests)
+        with mock.patch.object(Response, "close", autospec=True) as close:
+            requests.close()
+            for _ in range(100):
+                if close.call_count == 2:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(close.call_count, 2)
+
+
+class TestJsonItems(TestCase):
+    document = {"meta": {"total": 3}, "data": [{"id": 1, "name": "a"}, {"id": 2, "name": "b"},
+                                               {"id": 3}]}
+
+    def get_app(self):
+        import json
+
+        def app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "application/json")])
+            return [json.dumps(self.document).encode("utf-8")]
+        return app
+
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("items.test", 80, self.get_app)
+        self.service = JsonService(url="http://items.test/", items="$.data[*]",
+                                   jsonpath={"id": "$.id", "name": "$.name"})
+        self.service.swallow_exceptions = False
+        self.service.chunk_size = 8
+        self.expected = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}, {"id": 3}]
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def test_items(self):
+        self.assertEqual(list(self.service), self.expected)
+
+    def test_stream_items(self):
+        self.service.conf = dict(self.service.conf, stream=True)
+        response = next(self.service.make_requests())
+        items = self.service.decode_response(response)
+        self.assertEqual(next(items), {"id": 1, "name": "a"})
+        self.assertFalse(hasattr(response, "decoded"))
+        self.assertEqual(list(self.service), self.expected)
+
+    def test_spool_items(self):
+        self.service.conf = dict(self.service.conf, spool=16)
+        self.assertEqual(list(self.service), self.expected)
+
+    def test_spool_released(self):
+        self.service.conf = dict(self.service.conf, spool=16)
+        response = next(self.service.make_requests())
+        body_map = response.body_map
+        results = self.service._conditional_results(response)
+        self.assertEqual(list(results), self.expected)
+        self.assertTrue(body_map.closed)
+        self.assertFalse(hasattr(response, "body_map"))
+
+    def test_spool_released_early(self):
+        self.service.conf = dict(self.service.conf, spool=16)
+        response = next(self.service.make_requests())
+        results = self.service._conditional_results(response)
+        self.assertEqual(next(results), self.expected[0])
+        results.close()
+        self.assertFalse(hasattr(response, "body_map"))
+
+    def test_stream_complex_items(self):
+        self.service.conf = dict(self.service.conf, stream=True, items="$.data[?id > 1]")
+        self.assertEqual(list(self.service), self.expected[1:])
@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+import jsonpath_rw_ext
+
+from libweb import jsonpath
+
+
+DOCUMENTS = [
+    {"a": {"b": 1, "c": [1, 2]}, "list": [{"b": "x"}, {"c": "y"}, {"b": None}, 3]},
+    {"a": [{"b": 1}, {"b": {"c": 2}}], "list": {"b": "single"}},
+    {"a": "string", "list": ["abc", [1, [2]]], "n": 5, "t": True},
+    {"a": None, "list": [], "empty": {}},
+    [{"a": 1}, {"a": 2}],
+    "scalar",
+]
+
+EXPRESSIONS = [
+    "$", "$.a", "$.a.b", "$.a.c", "$.a.c[1]", "$.a[0]", "$.a[*]", "$.a[*].b",
+    "$.a[*].b.c", "$.list[*]", "$.list[*].b", "$.list[0]", "$.list[5]",
+    "$.list[1][1]", "$.list[*][*]", "$.missing", "$.missing[*].b", "$[*].a",
+    "$[0].a", "$.n[*]", "$.t[*]", "$.empty[*]", "$.empty.a",
+]
+
+
+class TestJsonpath(TestCase):
+    def setUp(self):
+        jsonpath.reset()
+
+    def test_simple_paths_match_jsonpath_rw_ext(self):
+        for expression in EXPRESSIONS:
+            path = jsonpath.parse(expression)
+            self.assertIsInstance(path, jsonpath.SimplePath, expression)
+            expr = jsonpath_rw_ext.parse(expression)
+            for data in DOCUMENTS:
+                try:
+                    expected = [match.value for match in expr.find(data)]
+                except Exception as exc:  # pylint: disable=broad-except
+                    self.assertRaises(type(exc), path.values, data)
+                else:
+                    self.assertEqual(path.values(data), expected, (expression, data))
+
+    def test_complex_paths_fall_back(self):
+        data = {"a": [{"b": 3, "n": "x"}, {"b": 1, "n": "y"}], "c-d": 1}
+        for (expression, expected) in (
+                ("$.a[?b > 2].n", ["x"]),
+                ("$.a[1:].n", ["y"]),
+                ("$.a.`len`", [2]),
+                ("$..n", ["x", "y"]),
+                ("$.*.b", []),
+                ("a[*].n", ["x", "y"]),
+        ):
+            path = jsonpath.parse(expression)
+            self.assertIsInstance(path, jsonpath.ExtendedPath, expression)
+            self.assertEqual(path.values(data), expected, expression)
+
+    def test_compiled_once(self):
+        self.assertIs(jsonpath.parse("$.a.b"), jsonpath.parse("$.a.b"))
+        self.assertIs(jsonpath.parse("$..b"), jsonpath.parse("$..b"))
+        jsonpath.reset()
+        self.assertEqual(jsonpath._compiled, {})  # pylint: disable=protected-access
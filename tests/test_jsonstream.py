@@ -0,0 +1,61 @@
+import io
+import json
+from unittest import TestCase
+
+from libweb.jsonstream import iter_items, parse_path
+
+
+class TestJsonStream(TestCase):
+    def items(self, data, path, chunk_size=1):
+        return list(iter_items(io.StringIO(data), path, chunk_size=chunk_size))
+
+    def assert_items(self, document, path, expected):
+        data = json.dumps(document, indent=1)
+        for chunk_size in (1, 3, 7, 1024):
+            self.assertEqual(self.items(data, path, chunk_size), expected, chunk_size)
+
+    def test_parse_path(self):
+        self.assertEqual(parse_path("$[*]"), [])
+        self.assertEqual(parse_path("$.data.events[*]"), ["data", "events"])
+        for path in ("$.data", "$..data[*]", "$.data[0]", "$.data[*].id", "data[*]"):
+            self.assertRaises(ValueError, parse_path, path)
+
+    def test_top_level_array(self):
+        self.assert_items([1, "two", {"three": [3]}, None, 12345.5e3], "$[*]",
+                          [1, "two", {"three": [3]}, None, 12345.5e3])
+
+    def test_nested_array(self):
+        document = {
+            "meta": {"skip": ["[", "]", "{", "}"], "nested": {"data": [0]}},
+            'escaped "data"': [0],
+            "data": {"total": 2, "events": [{"id": 1}, {"id": "2,]"}]},
+            "trailing": "never read",
+        }
+        self.assert_items(document, "$.data.events[*]", [{"id": 1}, {"id": "2,]"}])
+
+    def test_empty_and_missing(self):
+        self.assert_items({"data": []}, "$.data[*]", [])
+        self.assert_items({}, "$.data[*]", [])
+        self.assert_items({"other": 1}, "$.data[*]", [])
+        self.assert_items({"data": {"events": 1}}, "$.data.other[*]", [])
+        self.assert_items([], "$.data[*]", [])
+
+    def test_not_an_array(self):
+        self.assert_items({"data": {"id": 1}}, "$.data[*]", [{"id": 1}])
+        self.assert_items({"data": 5}, "$.data[*]", [5])
+
+    def test_numbers_split_across_chunks(self):
+        self.assertEqual(self.items("[123456789,987654321]", "$[*]", 4),
+                         [123456789, 987654321])
+        self.assertEqual(self.items("[1e10]", "$[*]", 2), [1e10])
+
+    def test_lazy(self):
+        body = io.StringIO('{"data": [{"id": 1}, {"id": 2}, ' + " " * 10000 + "}")
+        items = iter_items(body, "$.data[*]", chunk_size=16)
+        self.assertEqual(next(items), {"id": 1})
+        self.assertLess(body.tell(), 100)
+
+    def test_invalid(self):
+        for data in ('{"data": [1, 2', '{"data": [1 2]}', '{"data" 1}', "[tru]"):
+            with self.assertRaises(ValueError):
+                self.items(data, "$.data[*]" if "data" in data else "$[*]")
@@ -0,0 +1,100 @@
+import logging
+from unittest import TestCase
+
+import fauxfactory
+import httpbin.core
+from wsgi_intercept import add_wsgi_intercept, requests_intercept
+
+from libweb import WebService
+from libweb.json import JsonService
+from libweb.metrics import Histogram, HistogramMetrics, timed_iter
+from libweb.xpath import XpathService
+
+
+class TestHistogram(TestCase):
+    def test_observe(self):
+        histogram = Histogram(buckets=(1, 5))
+        for value in (0.5, 2, 3, 10):
+            histogram.observe(value)
+
+        data = histogram.as_dict()
+        self.assertEqual(data["count"], 4)
+        self.assertEqual(data["sum"], 15.5)
+        self.assertEqual(data["buckets"], [(1, 1), (5, 3), (float("inf"), 4)])
+
+
+class TestHistogramMetrics(TestCase):
+    def setUp(self):
+        self.metrics = HistogramMetrics()
+        self.service = WebService()
+        self.service.metrics = self.metrics
+
+    def test_snapshot(self):
+        self.metrics.timing(self.service, "network", 0.2)
+        self.metrics.count(self.service, "bytes", 10)
+        self.metrics.count(self.service, "bytes", 5)
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["WebService"]["bytes"], 15)
+        self.assertEqual(snapshot["timings"]["WebService"]["network"]["count"], 1)
+
+    def test_render(self):
+        self.metrics.timing(self.service, "parse", 0.002)
+        self.metrics.count(self.service, "results", 3)
+
+        text = self.metrics.render()
+        self.assertIn('libweb_phase_seconds_count{service="WebService",phase="parse"} 1', text)
+        self.assertIn('libweb_total{service="WebService",counter="results"} 3', text)
+
+    def test_reset(self):
+        self.metrics.count(self.service, "results", 3)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot(), {"timings": {}, "counters": {}})
+
+    def test_timed_iter_records_on_exhaustion(self):
+        self.assertEqual(list(timed_iter(self.service, "extract", range(3))), [0, 1, 2])
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["timings"]["WebService"]["extract"]["count"], 1)
+
+
+class TestServiceMetrics(TestCase):
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("httpbin.org", 80, lambda: httpbin.core.app)
+
+        logging.getLogger("requests").setLevel("ERROR")
+        self.metrics = HistogramMetrics()
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def test_json_phases(self):
+        service = JsonService(fauxfactory.gen_ipaddr(), **{
+            "url": "http://httpbin.org/get",
+            "jsonpath": {"host": "$.headers.Host"},
+        })
+        service.metrics = self.metrics
+        service.swallow_exceptions = False
+        self.assertEqual(len(list(service)), 1)
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(set(snapshot["timings"]["JsonService"]),
+                         set(["network", "parse", "extract", "query"]))
+        counters = snapshot["counters"]["JsonService"]
+        self.assertEqual(counters["requests"], 1)
+        self.assertEqual(counters["results"], 1)
+        self.assertGreater(counters["bytes"], 0)
+
+    def test_xpath_decompress_phase(self):
+        service = XpathService(fauxfactory.gen_ipaddr(), **{
+            "url": "http://httpbin.org/xml",
+            "decompress": True,
+            "xpath": {"title": '//slide[@type="all"][1]/title/text()'},
+        })
+        service.metrics = self.metrics
+        service.swallow_exceptions = False
+        self.assertEqual(len(list(service)), 1)
+
+        timings = self.metrics.snapshot()["timings"]["XpathService"]
+        self.assertEqual(set(timings),
+                         set(["network", "decompress", "parse", "extract", "query"]))
@@ -0,0 +1,67 @@
+import logging
+from unittest import TestCase
+
+import fauxfactory
+import httpbin.core
+from wsgi_intercept import add_wsgi_intercept, requests_intercept
+
+from libweb.http import HttpService
+from libweb.pool import PoolRegistry
+
+
+class TestPoolRegistry(TestCase):
+    def setUp(self):
+        self.registry = PoolRegistry()
+
+    def tearDown(self):
+        self.registry.close()
+
+    def test_adapters_shared_by_config(self):
+        first = self.registry.get_adapter(maxsize=5)
+        self.assertIs(first, self.registry.get_adapter(maxsize=5))
+        self.assertIsNot(first, self.registry.get_adapter(maxsize=6))
+
+    def test_services_share_adapter(self):
+        class PooledService(HttpService):
+            pool_registry = self.registry
+
+        first = PooledService(url="https://example.com/a")
+        second = PooledService(url="https://example.com/b")
+        self.assertIsNot(first.session, second.session)
+        self.assertIs(first.session.get_adapter("https://example.com/"),
+                      second.session.get_adapter("https://example.org/"))
+        self.assertIs(first.session.get_adapter("http://example.com/"),
+                      first.session.get_adapter("https://example.com/"))
+
+    def test_pool_settings(self):
+        class PooledService(HttpService):
+            pool_registry = self.registry
+
+        service = PooledService(pool={"maxsize": 3, "block": True, "keep_alive": False})
+        adapter = service.session.get_adapter("https://example.com/")
+        self.assertIs(adapter, self.registry.get_adapter(maxsize=3, block=True))
+        self.assertEqual(service.session.headers["Connection"], "close")
+
+    def test_registry_disabled(self):
+        class UnpooledService(HttpService):
+            pool_registry = None
+
+        first = UnpooledService()
+        second = UnpooledService()
+        self.assertIsNot(first.session.get_adapter("https://example.com/"),
+                         second.session.get_adapter("https://example.com/"))
+
+
+class TestPooledRequests(TestCase):
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("httpbin.org", 80, lambda: httpbin.core.app)
+        logging.getLogger("requests").setLevel("ERROR")
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def test_requests_through_shared_pool(self):
+        for _ in range(3):
+            service = HttpService(fauxfactory.gen_ipaddr())
+            self.assertEqual(service._req("http://httpbin.org/get").status_code, 200)
@@ -0,0 +1,82 @@
+import logging
+import time
+from unittest import TestCase
+
+import fauxfactory
+import httpbin.core
+from wsgi_intercept import add_wsgi_intercept, requests_intercept
+
+from libweb import ratelimit
+from libweb.http import HttpService
+
+
+class TestTokenBucket(TestCase):
+    def test_burst_is_free(self):
+        bucket = ratelimit.TokenBucket(1, per=60, burst=3)
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+
+    def test_requests_queue(self):
+        bucket = ratelimit.TokenBucket(10)
+        delays = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(delays[0], 0.0)
+        for (expected, delay) in zip((0.1, 0.2, 0.3), delays[1:]):
+            self.assertAlmostEqual(delay, expected, places=2)
+
+    def test_acquire_paces(self):
+        bucket = ratelimit.TokenBucket(50)
+        start = time.time()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.07)
+
+
+class TestLimiterRegistry(TestCase):
+    def setUp(self):
+        ratelimit.reset()
+        self.service = HttpService()
+
+    def tearDown(self):
+        ratelimit.reset()
+
+    def test_no_limit(self):
+        self.assertIsNone(self.service.get_rate_limiter("http://example.com/", {}))
+
+    def test_shared_by_host(self):
+        conf = {"rate_limit": {"rate": 1}}
+        first = self.service.get_rate_limiter("http://example.com/a", conf)
+        second = HttpService().get_rate_limiter("http://example.com/b", conf)
+        other = self.service.get_rate_limiter("http://example.org/a", conf)
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+    def test_shared_by_auth_name(self):
+        conf = {"rate_limit": {"rate": 1}, "auth": {"name": "vt", "params": ["apikey"]}}
+        first = self.service.get_rate_limiter("http://example.com/", conf)
+        second = self.service.get_rate_limiter("http://example.org/", conf)
+        self.assertIs(first, second)
+
+    def test_explicit_key(self):
+        conf = {"rate_limit": {"rate": 1, "key": "shared"}}
+        first = self.service.get_rate_limiter("http://example.com/", conf)
+        self.assertIs(first, ratelimit.get_limiter("shared", 1))
+
+
+class TestRateLimitedRequests(TestCase):
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("httpbin.org", 80, lambda: httpbin.core.app)
+        logging.getLogger("requests").setLevel("ERROR")
+        ratelimit.reset()
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+        ratelimit.reset()
+
+    def test_requests_are_paced(self):
+        service = HttpService(fauxfactory.gen_ipaddr())
+        conf = {"rate_limit": {"rate": 20}}
+
+        start = time.time()
+        for _ in range(4):
+            self.assertEqual(service._req("http://httpbin.org/get", **conf).status_code, 200)
+        self.assertGreaterEqual(time.time() - start, 0.14)
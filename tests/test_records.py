@@ -0,0 +1,43 @@
+import pickle
+from collections import OrderedDict
+from unittest import TestCase
+
+from libweb.records import Record, record_type
+
+
+class TestRecords(TestCase):
+    def setUp(self):
+        self.cls = record_type(("name", "class", "ttl"))
+        self.record = self.cls(("example.com.", "IN", 60))
+
+    def test_types_are_shared(self):
+        self.assertIs(record_type(["name", "class", "ttl"]), self.cls)
+        self.assertTrue(issubclass(self.cls, Record))
+
+    def test_mapping_access(self):
+        self.assertEqual(self.record["class"], "IN")
+        self.assertEqual(self.record.get("missing", 1), 1)
+        self.assertIn("ttl", self.record)
+        self.assertNotIn("IN", self.record)
+        self.assertEqual(list(self.record), ["name", "class", "ttl"])
+        self.assertEqual(len(self.record), 3)
+        with self.assertRaises(KeyError):
+            self.record["missing"]
+
+    def test_dict_conversion(self):
+        expected = OrderedDict([("name", "example.com."), ("class", "IN"), ("ttl", 60)])
+        self.assertEqual(self.record.as_dict(), expected)
+        self.assertEqual(dict(self.record), dict(expected))
+        self.assertEqual(self.record, dict(expected))
+
+        data = dict()
+        data.update(self.record)
+        self.assertEqual(data, dict(expected))
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(self.record, "__dict__"))
+
+    def test_pickle(self):
+        copy = pickle.loads(pickle.dumps(self.record))
+        self.assertEqual(copy, self.record)
+        self.assertIs(type(copy), self.cls)
@@ -57,3 +57,26 @@ class TestRegex(TestCase):
             data.update(_)
         self.assertIn("disallowed", data)
         self.assertEqual(data["disallowed"], "/deny")
+
+    def test_compact_results(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/robots.txt",
+            "parse": [
+                "Disallow: (?P<disallowed>.+)",
+                "User-agent: (?P<agent>.+)",
+            ]
+        }
+        self.service.compact_results = True
+
+        results = list(self.service)
+        self.assertEqual(list(results[0]), ["disallowed", "agent"])
+        self.assertEqual(results[0]["disallowed"], "/deny")
+        self.assertEqual(results[0]["agent"], "*")
+
+    def test_get_html_override(self):
+        class StaticService(RegexService):
+            def get_html(self):
+                yield "<b>first</b> <b>second</b>"
+
+        service = StaticService(parse=["<b>(?P<bold>[a-z]+)</b>"])
+        self.assertEqual(list(service), [{"bold": "first"}, {"bold": "second"}])
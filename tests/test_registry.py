@@ -0,0 +1,18 @@
+from unittest import TestCase
+
+from libweb.registry import Registry
+
+
+class TestRegistry(TestCase):
+    def test_first_configuration_shared(self):
+        registry = Registry(dict)
+        first = registry.get("key", size=1)
+        self.assertIs(registry.get("key", size=2), first)
+        self.assertEqual(first, {"size": 1})
+        self.assertIsNot(registry.get("other", size=1), first)
+
+    def test_reset(self):
+        registry = Registry(dict)
+        first = registry.get("key")
+        registry.reset()
+        self.assertIsNot(registry.get("key"), first)
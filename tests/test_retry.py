@@ -0,0 +1,144 @@
+import email.utils
+import time
+from unittest import TestCase
+
+import requests
+from wsgi_intercept import add_wsgi_intercept, requests_intercept
+
+from libweb import retry
+from libweb.http import HttpService
+
+
+class Response(object):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TestRetryPolicy(TestCase):
+    def test_backoff_is_jittered_and_bounded(self):
+        policy = retry.RetryPolicy(attempts=10, backoff=1, max_backoff=4)
+        for attempt in range(5):
+            delay = policy.delay(attempt, "GET")
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(4, 2 ** attempt))
+
+    def test_gives_up(self):
+        policy = retry.RetryPolicy(attempts=2)
+        self.assertIsNotNone(policy.delay(0, "GET"))
+        self.assertIsNone(policy.delay(1, "GET"))
+        self.assertIsNone(policy.delay(0, "POST"))
+        self.assertIsNone(policy.delay(0, "GET", Response(404)))
+        self.assertIsNone(policy.delay(0, "POST", Response(502)))
+        self.assertIsNone(policy.delay(0, "POST", Response(503)))
+        self.assertIsNotNone(policy.delay(0, "PUT", Response(502)))
+
+    def test_retry_after(self):
+        policy = retry.RetryPolicy(max_backoff=60)
+        self.assertEqual(policy.delay(0, "GET", Response(429, {"Retry-After": "7"})), 7)
+        self.assertEqual(policy.delay(0, "GET", Response(503, {"Retry-After": "600"})), 60)
+        self.assertEqual(policy.delay(0, "POST", Response(429, {"Retry-After": "7"})), 7)
+
+        date = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(retry.parse_retry_after(date), 30, delta=2)
+        self.assertIsNone(retry.parse_retry_after("soon"))
+
+
+class TestCircuitBreaker(TestCase):
+    def test_opens_after_threshold(self):
+        breaker = retry.CircuitBreaker(threshold=2, reset_after=60)
+        breaker.failure()
+        breaker.check()
+        breaker.failure()
+        with self.assertRaises(retry.CircuitOpenError):
+            breaker.check()
+
+    def test_success_resets(self):
+        breaker = retry.CircuitBreaker(threshold=2, reset_after=60)
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        breaker.check()
+
+    def test_half_open_trial(self):
+        breaker = retry.CircuitBreaker(threshold=1, reset_after=0)
+        breaker.failure()
+        breaker.check()
+        with self.assertRaises(retry.CircuitOpenError):
+            breaker.check()
+        breaker.failure()
+        breaker.check()
+        breaker.success()
+        breaker.check()
+        breaker.check()
+
+
+class TestHttpRetries(TestCase):
+    def get_app(self):
+        def app(environ, start_response):
+            self.hits += 1
+            if self.failures:
+                self.failures -= 1
+                start_response("503 Service Unavailable", [("Retry-After", "0")])
+                return [b"down"]
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"up"]
+        return app
+
+    def setUp(self):
+        retry.reset()
+        requests_intercept.install()
+        add_wsgi_intercept("flaky.test", 80, self.get_app)
+        self.hits = 0
+        self.failures = 0
+        self.service = HttpService()
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+        retry.reset()
+
+    def test_retries_until_success(self):
+        self.failures = 2
+        r = self.service._req("http://flaky.test/", retry={"attempts": 3})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.hits, 3)
+
+    def test_retries_exhausted(self):
+        self.failures = 5
+        r = self.service._req("http://flaky.test/", retry={"attempts": 2})
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(self.hits, 2)
+
+    def test_no_retries_by_default(self):
+        self.failures = 1
+        self.assertEqual(self.service._req("http://flaky.test/").status_code, 503)
+        self.assertEqual(self.hits, 1)
+
+    def test_connection_errors_retried(self):
+        calls = list()
+        send_request = self.service.send_request
+
+        def flaky_send(request, **kwargs):
+            calls.append(request)
+            if len(calls) == 1:
+                raise requests.exceptions.ConnectionError("reset")
+            return send_request(request, **kwargs)
+
+        self.service.send_request = flaky_send
+        r = self.service._req("http://flaky.test/", retry={"attempts": 2, "backoff": 0})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(calls), 2)
+
+    def test_circuit_breaker_fails_fast(self):
+        self.failures = 10
+        conf = {"circuit_breaker": {"threshold": 2, "reset": 60}}
+        for _ in range(2):
+            self.service._req("http://flaky.test/", **conf)
+        with self.assertRaises(retry.CircuitOpenError):
+            self.service._req("http://flaky.test/", **conf)
+        self.assertEqual(self.hits, 2)
+
+        other = HttpService()
+        self.assertIs(other.get_circuit_breaker("http://flaky.test/x", conf),
+                      self.service.get_circuit_breaker("http://flaky.test/", conf))
+        self.assertIsNone(other.get_circuit_breaker("http://flaky.test/", {}))
@@ -0,0 +1,166 @@
+import threading
+try:
+    from unittest import mock, TestCase
+except ImportError:
+    from unittest import TestCase
+    from mock import mock
+
+from helpers import run_concurrently
+from wsgi_intercept import add_wsgi_intercept, requests_intercept
+
+from libweb import singleflight
+from libweb.dns import DnsService
+from libweb.json import JsonService
+from libweb.metrics import HistogramMetrics
+from libweb.singleflight import SingleFlight
+
+
+class WaitingEvent(object):
+    """Wraps the done event of an in-flight call, setting all_waiting once count
+    callers are waiting for it
+    """
+
+    def __init__(self, event, waiting, count, all_waiting):
+        self.event = event
+        self.waiting = waiting
+        self.count = count
+        self.all_waiting = all_waiting
+
+    def wait(self, timeout=None):
+        self.waiting.append(True)
+        if len(self.waiting) >= self.count:
+            self.all_waiting.set()
+        return self.event.wait(timeout)
+
+    def set(self):
+        self.event.set()
+
+
+class HandshakeMixin(object):
+    """Lets the leader of an in-flight call wait until the other callers are
+    waiting for it, instead of sleeping
+    """
+
+    def watch_waiters(self, count):
+        self.all_waiting = threading.Event()
+        waiting = list()
+        make_call = singleflight._Call
+
+        def watched_call():
+            call = make_call()
+            call.done = WaitingEvent(call.done, waiting, count, self.all_waiting)
+            return call
+
+        patcher = mock.patch.object(singleflight, "_Call", watched_call)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestSingleFlight(HandshakeMixin, TestCase):
+    def setUp(self):
+        self.group = SingleFlight()
+        self.calls = list()
+        self.watch_waiters(4)
+
+    def slow(self, value):
+        def func():
+            self.calls.append(value)
+            self.all_waiting.wait(5)
+            if isinstance(value, Exception):
+                raise value
+            return value
+        return func
+
+    def test_concurrent_calls_coalesced(self):
+        (results, _) = run_concurrently(lambda _: self.group.do("key", self.slow(1)), range(5))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sorted(results), [(1, False)] + [(1, True)] * 4)
+        self.assertEqual(self.group.calls, {})
+
+    def test_exceptions_shared(self):
+        (_, errors) = run_concurrently(lambda _: self.group.do("key", self.slow(ValueError())),
+                                       range(5))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(errors), 5)
+
+    def test_sequential_calls_not_coalesced(self):
+        self.assertEqual(self.group.do("key", lambda: 1), (1, False))
+        self.assertEqual(self.group.do("key", lambda: 2), (2, False))
+        self.assertEqual(self.group.do("other", lambda: 3), (3, False))
+
+
+class TestCoalescedServices(HandshakeMixin, TestCase):
+    def get_app(self):
+        def app(environ, start_response):
+            self.hits.append(environ.get("QUERY_STRING", ""))
+            if len(self.hits) == self.concurrent:
+                self.all_arrived.set()
+            # Hold each request until the others have coalesced with it, or
+            # (for requests which are not coalesced) have all been sent
+            self.all_waiting.wait(5)
+            self.all_arrived.wait(5)
+            start_response("200 OK", [("Content-Type", "application/json")])
+            return [b'{"ip": "10.0.0.1"}']
+        return app
+
+    def setUp(self):
+        requests_intercept.install()
+        add_wsgi_intercept("api.test", 80, self.get_app)
+        self.hits = list()
+        self.metrics = HistogramMetrics()
+        self.concurrent = 1
+        self.all_arrived = threading.Event()
+        self.watch_waiters(4)
+
+    def tearDown(self):
+        requests_intercept.uninstall()
+
+    def make_service(self, cls, **conf):
+        service = cls(**conf)
+        service.single_flight = SingleFlight()
+        service.metrics = self.metrics
+        service.swallow_exceptions = False
+        return service
+
+    def test_http(self):
+        service = self.make_service(JsonService, url="http://api.test/?q={target}",
+                                    jsonpath={"ip": "$.ip"})
+        (results, _) = run_concurrently(lambda _: list(service.bind({"target": "a"})),
+                                        range(5))
+        self.assertEqual(results, [[{"ip": "10.0.0.1"}]] * 5)
+        self.assertEqual(self.hits, ["q=a"])
+
+        counters = self.metrics.snapshot()["counters"]["JsonService"]
+        self.assertEqual(counters["requests"], 1)
+        self.assertEqual(counters["coalesced"], 4)
+
+    def test_http_different_requests(self):
+        service = self.make_service(JsonService, url="http://api.test/?q={target}")
+        self.concurrent = 5
+        self.all_waiting.set()
+        run_concurrently(lambda target: list(service.bind({"target": target})), list("abcde"))
+        self.assertEqual(sorted(self.hits), ["q=a", "q=b", "q=c", "q=d", "q=e"])
+
+    def test_http_stream_not_coalesced(self):
+        service = self.make_service(JsonService, url="http://api.test/", stream=True)
+        self.concurrent = 3
+        self.all_waiting.set()
+        run_concurrently(lambda _: list(service), range(3))
+        self.assertEqual(len(self.hits), 3)
+
+    def test_dns(self):
+        import dns.resolver
+
+        service = self.make_service(DnsService, rrname="{target}.example.com", rrtype="A")
+        service.parse_response = lambda rrset: [rrset]
+
+        def query(resolver, rrname, rrtype):
+            self.hits.append(rrname)
+            self.all_waiting.wait(5)
+            return rrname
+
+        with mock.patch.object(dns.resolver.Resolver, "query", new=query):
+            (results, _) = run_concurrently(lambda _: list(service.bind({"target": "a"})),
+                                            range(5))
+        self.assertEqual(results, [["a.example.com."]] * 5)
+        self.assertEqual(self.hits, ["a.example.com."])
@@ -0,0 +1,62 @@
+try:
+    from unittest import mock, TestCase
+except ImportError:
+    from unittest import TestCase
+    from mock import mock
+
+from libweb import timeparams
+
+
+class TestTimeParams(TestCase):
+    def setUp(self):
+        timeparams.reset()
+
+    def tearDown(self):
+        timeparams.reset()
+
+    def test_matches_relatime(self):
+        import relatime
+        import pytz
+        from tzlocal import get_localzone
+
+        expected = relatime.timeParser("-1d@d", timezone=str(get_localzone()))
+        expected = expected.astimezone(pytz.timezone("America/New_York")).replace(tzinfo=None)
+        self.assertEqual(timeparams.resolve("-1d@d", timezone="America/New_York"),
+                         expected.strftime(timeparams.DEFAULT_FORMAT))
+
+    def test_resolved_once_per_bucket(self):
+        import relatime
+
+        with mock.patch.object(relatime, "timeParser", wraps=relatime.timeParser) as parser:
+            with mock.patch("time.time", return_value=1000005.0):
+                first = timeparams.resolve("-1h", bucket=60)
+            with mock.patch("time.time", return_value=1000019.0):
+                second = timeparams.resolve("-1h", bucket=60)
+            with mock.patch("time.time", return_value=1000021.0):
+                third = timeparams.resolve("-1h", bucket=60)
+        self.assertEqual(parser.call_count, 2)
+        self.assertEqual(first, second)
+        self.assertNotEqual(second, third)
+
+    def test_resolved_as_of_bucket_start(self):
+        with mock.patch("time.time", return_value=1000019.5):
+            value = timeparams.resolve("-1h", time_format="as_epoch", bucket=60)
+        self.assertEqual(value, str(999960 - 3600))
+
+    def test_no_bucket(self):
+        with mock.patch("time.time", return_value=1000019.0):
+            value = timeparams.resolve("now", time_format="as_epoch", bucket=0)
+        self.assertEqual(value, "1000019")
+
+    def test_not_bucketed_by_default(self):
+        with mock.patch("time.time", return_value=1000019.0):
+            value = timeparams.resolve("now", time_format="as_epoch")
+        self.assertEqual(value, "1000019")
+
+    def test_timezones_cached(self):
+        import tzlocal
+
+        timeparams.resolve("-1d")
+        with mock.patch.object(tzlocal, "get_localzone", side_effect=AssertionError):
+            timeparams.resolve("-2d")
+        self.assertIs(timeparams.get_timezone("UTC"), timeparams.get_timezone("UTC"))
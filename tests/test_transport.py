@@ -0,0 +1,93 @@
+import socket
+import threading
+from unittest import TestCase
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import httpbin.core
+import requests
+
+from libweb.http import HttpService
+from libweb.json import JsonService
+from libweb.transport import RequestsTransport, Urllib3Transport
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class LeanJsonService(JsonService):
+    transport = Urllib3Transport()
+
+
+class TestUrllib3Transport(TestCase):
+    def setUp(self):
+        self.server = make_server("127.0.0.1", 0, httpbin.core.app, handler_class=QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base_url = "http://127.0.0.1:{0}".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def results(self, cls, **conf):
+        service = cls(creds={"api": ["secret"]}, opts={"target": "example.com"}, **conf)
+        service.swallow_exceptions = False
+        return list(service)
+
+    def assert_same_results(self, **conf):
+        expected = self.results(JsonService, **conf)
+        self.assertEqual(self.results(LeanJsonService, **conf), expected)
+        return expected
+
+    def test_default_transport(self):
+        self.assertIsInstance(HttpService.transport, RequestsTransport)
+
+    def test_get_params_and_auth(self):
+        results = self.assert_same_results(
+            url=self.base_url + "/get",
+            params={"target": "{target}"},
+            auth={"name": "api", "headers": ["X-Api-Key"]},
+            jsonpath={"target": "$.args.target", "key": "$.headers.X-Api-Key",
+                      "agent": "$.headers.User-Agent"},
+        )
+        self.assertEqual(results[0]["target"], "example.com")
+        self.assertEqual(results[0]["key"], "secret")
+        self.assertEqual(results[0]["agent"], HttpService.user_agent)
+
+    def test_post_data(self):
+        results = self.assert_same_results(
+            url=self.base_url + "/post", method="post",
+            data={"target": "{target}"},
+            jsonpath={"target": "$.form.target"},
+        )
+        self.assertEqual(results, [{"target": "example.com"}])
+
+    def test_redirects_and_content_encoding(self):
+        self.assert_same_results(url=self.base_url + "/redirect/2",
+                                 jsonpath={"url": "$.url"})
+        results = self.assert_same_results(url=self.base_url + "/gzip",
+                                           jsonpath={"gzipped": "$.gzipped"})
+        self.assertEqual(results, [{"gzipped": True}])
+
+    def test_stream(self):
+        self.assert_same_results(url=self.base_url + "/stream/3", multi_json=True,
+                                 stream=True, jsonpath={"id": "$.id"})
+
+    def test_error_status(self):
+        service = LeanJsonService(url=self.base_url + "/status/404")
+        service.swallow_exceptions = False
+        with self.assertRaises(requests.exceptions.HTTPError):
+            list(service)
+
+    def test_connection_error(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        service = LeanJsonService()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            service._req("http://127.0.0.1:{0}/".format(port))
@@ -89,3 +89,90 @@ class TestXpath(TestCase):
             data.update(_)
         self.assertIn(result_key, data)
         self.assertEqual(data[result_key], "all")
+
+    def test_parse_executor(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        xpath = {"title": "//slide/title/text()"}
+        self.service.conf = {"url": ["http://httpbin.org/xml"] * 3, "xpath": xpath}
+        expected = list(self.service)
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.service.parse_executor = executor
+            self.assertEqual(list(self.service), expected)
+        self.assertEqual(len(expected), 6)
+
+    def test_parse_executor_settings(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from libweb.metrics import HistogramMetrics
+
+        self.service.conf = {"url": "http://httpbin.org/xml",
+                             "xpath": {"title": "//slide/title/text()"}}
+        self.service.compact_results = True
+        self.service.metrics = HistogramMetrics()
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            self.service.parse_executor = executor
+            results = list(self.service)
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(hasattr(result, "as_dict") for result in results))
+
+        timings = self.service.metrics.snapshot()["timings"]["XpathService"]
+        self.assertEqual(timings["parse"]["count"], 1)
+        self.assertEqual(timings["extract"]["count"], 1)
+
+    def test_parse_executor_backlog(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from libweb.metrics import HistogramMetrics
+
+        self.service.conf = {"url": ["http://httpbin.org/xml"] * 3,
+                             "xpath": {"title": "//slide/title/text()"}}
+        self.service.metrics = HistogramMetrics()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            self.service.parse_executor = executor
+            results = iter(self.service)
+            next(results)
+            counters = self.service.metrics.snapshot()["counters"]["XpathService"]
+            self.assertEqual(counters["requests"], 1)
+            self.assertEqual(len(list(results)), 5)
+
+    def test_parse_executor_html(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.html_service.conf = {"url": "http://httpbin.org/html", "xpath": {"h1": "//h1"}}
+        expected = list(self.html_service)
+
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            self.html_service.parse_executor = executor
+            self.assertEqual(list(self.html_service), expected)
+        self.assertEqual(len(expected), 1)
+
+    def test_compact_results(self):
+        self.service.conf = {
+            "url": "http://httpbin.org/xml",
+            "xpath": {"title": "//slide/title/text()"}
+        }
+        expected = list(self.service)
+        self.service.compact_results = True
+        results = list(self.service)
+        self.assertEqual(results, expected)
+        self.assertEqual([r.as_dict() for r in results], expected)
+
+    def test_stream(self):
+        xpath = {"title": "//slide/title/text()"}
+        self.service.conf = {"url": "http://httpbin.org/xml", "xpath": xpath}
+        expected = list(self.service)
+
+        self.service.conf = {"url": "http://httpbin.org/xml", "xpath": xpath, "stream": True}
+        self.assertEqual(list(self.service), expected)
+
+        self.html_service.conf = {"url": "http://httpbin.org/html", "xpath": {"h1": "//h1"},
+                                  "stream": True}
+        self.assertEqual(len(list(self.html_service)), 1)
+
+    def test_spool(self):
+        xpath = {"title": "//slide/title/text()"}
+        self.service.conf = {"url": "http://httpbin.org/xml", "xpath": xpath}
+        expected = list(self.service)
+
+        self.service.conf = {"url": "http://httpbin.org/xml", "xpath": xpath, "spool": 10}
+        self.assertEqual(list(self.service), expected)